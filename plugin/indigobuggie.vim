@@ -40,6 +40,10 @@ endfunction
 
 :let s:running_jobs = []
 
+:let s:server_python = ''
+:let s:template_job = v:none
+:let s:template_socket = ''
+
 " Sanity check
 if !has("python3")
 	call s:ErrorMessage("Beorn requires vim is compiled with python - sorry.")
@@ -116,6 +120,16 @@ if !exists("g:IB_project_name")
 	let g:IB_project_name= ""
 endif
 
+if !exists("g:IB_server_python")
+	" The python that runs the background servers, found on the path if not set.
+	let g:IB_server_python = ''
+endif
+
+if !exists("g:IB_use_server_template")
+	" Start the background servers from a pre-loaded python (needs unix sockets).
+	let g:IB_use_server_template = has('unix')
+endif
+
 if !exists("g:IB_UseUnicode")
 	if has('multi_byte')
 		set encoding=utf-8
@@ -145,6 +159,8 @@ function IB_OpenTab(...)
 		let path = a:0
 	endif
 
+	call s:StartServerTemplate()
+
 	let new_tab_id = py3eval("tab_control.addTab(vim.eval('path'), None, vim.eval('g:IB_enabled_features'))")
 endfunction																		"}}}
 " FUNCTION: IB_OpenProject	 													{{{
@@ -161,6 +177,8 @@ endfunction																		"}}}
 "	nothing.
 "
 function IB_OpenProject(project_name)
+	call s:StartServerTemplate()
+
 	let new_tab_id = py3eval("tab_control.addTab(None, vim.eval('a:project_name'), vim.eval('g:IB_enabled_features'))")
 endfunction																	   "}}}
 " FUNCTION: IB_CloseWindow														{{{
@@ -201,6 +219,34 @@ endfunction																		"}}}
 function IB_ToggleHelp()
 	py3 tab_control.toggleHelp()
 endfunction																	   "}}}
+" FUNCTION: IB_Timings 														{{{
+"
+" This function returns the startup timings of the current tab. Each is the
+" seconds from the tab opening to the first time it happened.
+"
+" vars:
+"	none
+"
+" returns:
+"	a dictionary of the timings.
+"
+function IB_Timings()
+	return py3eval("tab_control.getTimings()")
+endfunction																		"}}}
+" FUNCTION: IB_ServerStats 														{{{
+"
+" This function returns the number of status scans that the SCM server has
+" executed and skipped for each repository of the current tab.
+"
+" vars:
+"	none
+"
+" returns:
+"	a dictionary of repository root to {'scans': n, 'skipped': n}.
+"
+function IB_ServerStats()
+	return py3eval("tab_control.getServerStats()")
+endfunction																		"}}}
 " FUNCTION: IB_OpenToFile 														{{{
 "
 " This function will open the source tree (if in use) to the current file.
@@ -347,13 +393,15 @@ endfunction
 function! IB_StartBackgroundServer(tab_id, server_id, server_name, parameter)
 	let result = 0
 
-	" Detect what python3 runtime is called.
-	let py_3 = system('python3 -V')
+	call s:StartServerTemplate()
+
+	let server_command = [s:ServerPath(a:server_name), '' . a:tab_id, a:parameter]
 
-	if py_3[0:7] == 'Python 3'
-		let server_command = 'python3 ' . py3eval("os.path.join(vim.eval('s:plugin_path'), 'indigobuggie', 'servers', vim.eval('a:server_name') + '.py')") . " " . a:tab_id . " " . shellescape(a:parameter)
+	if s:template_socket != ''
+		" the launcher runs the server itself if the template is not ready yet.
+		let server_command = [s:ServerPython(), '-S', s:ServerPath('server_template'), 'launch', s:template_socket] + server_command
 	else
-		let server_command = 'python ' . py3eval("os.path.join(vim.eval('s:plugin_path'), 'indigobuggie', 'servers', vim.eval('a:server_name') + '.py')") . " " . a:tab_id . " " . shellescape(a:parameter)
+		let server_command = [s:ServerPython()] + server_command
 	endif
 
 	let new_job = job_start(server_command, {'in_mode':'raw', 'out_mode':'raw', 'out_cb':'IB_ServerCallBack'})
@@ -368,6 +416,35 @@ function! IB_StartBackgroundServer(tab_id, server_id, server_name, parameter)
 	return result
 endfunction
 "-------------------------------------------------------------------------------}}}
+" FUNCTION: IB_SendBackgroundServerMessage										{{{
+"
+" This function will send a message to a running server. The message is sent
+" as a single line, the server reads a line at a time.
+"
+" vars:
+"	tab_id			The tab that the server is connected to.
+"	server_id		The internal server ID
+"	message			The string to send to the server.
+"
+" returns:
+"	1 if the message was sent, 0 if the server was not found.
+"
+function! IB_SendBackgroundServerMessage(tab_id, server_id, message)
+	let result = 0
+
+	for item in s:running_jobs
+		if item['tab_id'] == a:tab_id && item['server_id'] == a:server_id
+			if ch_status(item['channel']) == "open"
+				call ch_sendraw(item['channel'], a:message . "\n")
+				let result = 1
+			endif
+			break
+		endif
+	endfor
+
+	return result
+endfunction
+"-------------------------------------------------------------------------------}}}
 " FUNCTION: IB_ServerCallBack													{{{
 "
 " This function is the callback for the window timers.
@@ -413,6 +490,73 @@ function s:AddFeature(name, load_mode)
 
 	call add(g:IB_enabled_features, {'name': a:name, 'loadable': a:load_mode})
 endfunction																		"}}}
+" FUNCTION: ServerPython														{{{
+"
+" This function returns the python that runs the background servers. It is
+" found once and remembered, so starting a server does not run a shell.
+"
+" vars:
+"	none
+"
+" returns:
+"	the python command.
+"
+function s:ServerPython()
+	if s:server_python == ''
+		if g:IB_server_python != ''
+			let s:server_python = g:IB_server_python
+		elseif executable('python3')
+			let s:server_python = exepath('python3')
+		else
+			let s:server_python = 'python'
+		endif
+	endif
+
+	return s:server_python
+endfunction																		"}}}
+" FUNCTION: ServerPath															{{{
+"
+" This function returns the path of the server script.
+"
+" vars:
+"	server_name		The name of the server.
+"
+" returns:
+"	the path of the script.
+"
+function s:ServerPath(server_name)
+	return s:plugin_path . '/indigobuggie/servers/' . a:server_name . '.py'
+endfunction																		"}}}
+" FUNCTION: StartServerTemplate													{{{
+"
+" This function starts the server template, a python that has the server
+" modules loaded and forks the servers when they are started. It is started
+" when the first IB tab is opened and runs until vim exits (it sees its stdin
+" close). It is restarted if it has died.
+"
+" vars:
+"	none
+"
+" returns:
+"	nothing.
+"
+function s:StartServerTemplate()
+	if g:IB_use_server_template
+		if s:template_socket != '' && job_status(s:template_job) != "run"
+			let s:template_socket = ''
+		endif
+
+		if s:template_socket == ''
+			let socket_path = tempname() . '.sock'
+			let template_job = job_start([s:ServerPython(), s:ServerPath('server_template'), 'template', socket_path], {'err_io': 'null', 'out_cb': {channel, message -> 0}})
+
+			if job_status(template_job) == "run"
+				let s:template_job = template_job
+				let s:template_socket = socket_path
+			endif
+		endif
+	endif
+endfunction																		"}}}
 "-------------------------------------------------------------------------------}}}
 " Auto functions and other vim settings.										{{{
 if g:IB_set_tab_line
@@ -381,7 +381,7 @@ class CodeReviewFeature(Feature):
 
 		if line != '':
 			value.append(line)
-			node.colour = len(value)
+			self.setLineNode(node, len(value))
 
 		return (node, value, skip_children)
 
@@ -527,7 +527,7 @@ class CodeReviewFeature(Feature):
 		if self.is_selected and self.current_window is not None:
 			contents = self.getHelp(self.keylist)
 
-			values = self.code_reviews.walkTree(self.renderFunction)
+			values = self.renderLines(self.code_reviews, self.renderFunction)
 
 			if values is None or values == []:
 				contents += [' - No Enabled Engines - ']
@@ -580,7 +580,7 @@ class CodeReviewFeature(Feature):
 
 	def handleSelectItem(self, line_no, action):
 		redraw = False
-		item = self.code_reviews.findItemWithColour(line_no)
+		item = self.getLineNode(line_no)
 
 		if item is not None:
 			if type(item) == Comment:
@@ -593,7 +593,7 @@ class CodeReviewFeature(Feature):
 
 	def handleShow(self, line_no, action):
 		redraw = False
-		item = self.code_reviews.findItemWithColour(line_no)
+		item = self.getLineNode(line_no)
 
 		# TODO: Handle Add --- don't need to do a diff.
 
@@ -648,7 +648,7 @@ class CodeReviewFeature(Feature):
 
 	def handleAddComment(self, line_no, action):
 		redraw = False
-		item = self.code_reviews.findItemWithColour(line_no)
+		item = self.getLineNode(line_no)
 
 		if item is not None:
 			comment = None
@@ -673,7 +673,7 @@ class CodeReviewFeature(Feature):
 
 	def handleVote(self, line_no, action):
 		redraw = False
-		item = self.code_reviews.findItemWithColour(line_no)
+		item = self.getLineNode(line_no)
 
 		vote = (action == CodeReviewFeature.CODE_REVIEW_UP_VOTE)
 
@@ -694,7 +694,7 @@ class CodeReviewFeature(Feature):
 
 	def handleApproval(self, line_no, approval):
 		redraw = False
-		item = self.code_reviews.findItemWithColour(line_no)
+		item = self.getLineNode(line_no)
 
 		if item is not None and type(item) == Change:
 			item.setState(getpass.getuser(), approval)
@@ -705,7 +705,7 @@ class CodeReviewFeature(Feature):
 
 	def handleDeleteComment(self, line_no, action):
 		redraw = False
-		item = self.code_reviews.findItemWithColour(line_no)
+		item = self.getLineNode(line_no)
 
 		if item is not None and type(item) == Comment:
 			item.deleteNode(True)
@@ -35,6 +35,8 @@ class Feature(object):
 		self.is_selected = False
 		self.help_length = 0
 		self.key_value = ''
+		self.line_nodes = []
+		self.rendered_nodes = []
 
 	def getHelp(self, key_list):
 		result = []
@@ -115,6 +117,41 @@ class Feature(object):
 	def renderTree(self):
 		pass
 
+	def renderLines(self, tree, render_function, *args):
+		""" Walk the tree with the render function and return the lines.
+
+			The render function calls setLineNode for the nodes it renders, so
+			when the walk is finished the node on each line is known without
+			having to search the tree.
+		"""
+		self.rendered_nodes = []
+
+		result = tree.walkTree(render_function, *args)
+
+		self.line_nodes = self.rendered_nodes
+
+		return result
+
+	def setLineNode(self, node, line_no):
+		""" Set the colour of the node and record it as the node on the line """
+		node.colour = line_no
+
+		if line_no >= len(self.rendered_nodes):
+			self.rendered_nodes.extend([None] * (line_no + 1 - len(self.rendered_nodes)))
+
+		# the first node rendered on the line is the one that is found.
+		if self.rendered_nodes[line_no] is None:
+			self.rendered_nodes[line_no] = node
+
+	def getLineNode(self, line_no):
+		""" Returns the node rendered on the line, or None """
+		result = None
+
+		if 0 <= line_no < len(self.line_nodes):
+			result = self.line_nodes[line_no]
+
+		return result
+
 	def onBufferWrite(self, window_number):
 		pass
 
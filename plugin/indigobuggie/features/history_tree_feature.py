@@ -101,12 +101,36 @@ class HistoryTreeFeature(Feature):
 		else:
 			self.version_id = version_id
 
-		self.details = self.selected_scm.getCommitDetails(self.version_id)
+		# the details are fetched by the scm server, they are rendered when they arrive.
+		self.details = None
+		version_id = self.version_id
+		self.requestFromSCM('commit_details', lambda details: self.onCommitDetails(version_id, details), version_id)
 
 		self.version_changed = True
 		self.updateTree()
 		self.renderTree()
 
+	def onCommitDetails(self, version_id, details):
+		# ignore the details for versions that are no longer current.
+		if version_id == self.version_id:
+			self.details = details
+			self.renderTree()
+
+	def requestFromSCM(self, request, callback, version_id, path=None):
+		""" Send the request for the selected scm to the scm server """
+		scm_feature = self.tab_window.getFeature('SCMFeature')
+
+		if scm_feature is not None:
+			if request == 'file':
+				scm_feature.requestFile(self.selected_scm, path, version_id, callback)
+			else:
+				scm_feature.requestCommitDetails(self.selected_scm, version_id, callback)
+
+		elif request == 'file':
+			callback(self.selected_scm.getFile(path, version_id))
+		else:
+			callback(self.selected_scm.getCommitDetails(version_id))
+
 	def initialise(self, tab_window):
 		self.tab_window = tab_window
 
@@ -179,7 +203,7 @@ class HistoryTreeFeature(Feature):
 		if value is None:
 			value = []
 
-		if node.getName() != '' and node.getName()[0] == '.' and self.tab_window.getConfiguration('SourceTreeFeature', 'hide_dot_files'):
+		if node.getName() != '' and node.getName()[0] == '.' and self.tab_window.getConfiguration('SourceTreeFeature', 'hide_dot_files') in (True, 'True'):
 			# Ignore this file/directory and it's children as it is a .dot file and we are ignoring them.
 			skip_children = True
 
@@ -192,7 +216,7 @@ class HistoryTreeFeature(Feature):
 
 			if level > 0:
 				value.append(line)
-				node.colour = len(value) + 4	# The offset for the header -  know magic number.
+				self.setLineNode(node, len(value) + 4)	# The offset for the header -  know magic number.
 
 		return (node, value, skip_children)
 
@@ -223,19 +247,25 @@ class HistoryTreeFeature(Feature):
 
 				contents = self.getHelp(self.keylist)
 				contents.append("Version: " + self.version_id)
-				contents.append("Date   : " + time.strftime("%Y-%m-%d", time.gmtime(int(self.details.timestamp))))
-				contents.append("Author : " + self.details.author)
+
+				if self.details is not None:
+					contents.append("Date   : " + time.strftime("%Y-%m-%d", time.gmtime(int(self.details.timestamp))))
+					contents.append("Author : " + self.details.author)
+				else:
+					contents.append("Date   : ")
+					contents.append("Author : ")
+
 				contents.append(" ")
 
 				if self.source_tree is not None:
-					contents += self.source_tree.walkTree(self.all_nodes_function, self.getOrder())
+					contents += self.renderLines(self.source_tree, self.all_nodes_function, self.getOrder())
 
 				self.tab_window.setBufferContents(self.buffer_id, contents)
 
 	def handleSelectItem(self, line_no, action):
 		redraw = False
 
-		item = self.source_tree.findItemWithColour(line_no, self.getOrder())
+		item = self.getLineNode(line_no)
 
 		if item is not None:
 			if item.isDir():
@@ -244,14 +274,14 @@ class HistoryTreeFeature(Feature):
 			else:
 				if self.selected_scm is not None:
 					self.handleCloseDiffs(0, 1)
-					contents = self.selected_scm.getFile(item.getPath(True), self.version_id)
-					self.tab_window.openFileWithContent(self.version_id + ':' + item.getName(), contents, readonly=True)
+					name = self.version_id + ':' + item.getName()
+					self.requestFromSCM('file', lambda contents: self.showFileContents(name, contents), self.version_id, item.getPath(True))
 
 		return (redraw, line_no)
 
 	def handleDiffItem(self, line_no, action):
 		redraw = False
-		item = self.source_tree.findItemWithColour(line_no, self.getOrder())
+		item = self.getLineNode(line_no)
 
 		if item is not None and item.getFlag() != 'D':
 			# always close the diffs.
@@ -259,17 +289,22 @@ class HistoryTreeFeature(Feature):
 
 			if self.selected_scm is not None:
 				file_path = item.getPath(True)
+				window_2_name = self.version_id + ':' + item.getName()
+				self.requestFromSCM('file', lambda contents: self.showDiff(file_path, window_2_name, contents), self.version_id, file_path)
 
-				window_1 = self.tab_window.openFile(file_path)
+		return (redraw, line_no)
 
-				contents = self.selected_scm.getFile(file_path, self.version_id)
-				window_2_name = self.version_id + ':' + item.getName()
-				window_2 = self.tab_window.openFileWithContent(window_2_name, contents, force_new=True, readonly=True)
+	def showFileContents(self, name, contents):
+		if contents is not None:
+			self.tab_window.openFileWithContent(name, contents, readonly=True)
 
-				self.tab_window.diffWindows(window_1, window_2)
-				self.diff_window_list.append(window_2_name)
+	def showDiff(self, file_path, window_2_name, contents):
+		if contents is not None:
+			window_1 = self.tab_window.openFile(file_path)
+			window_2 = self.tab_window.openFileWithContent(window_2_name, contents, force_new=True, readonly=True)
 
-		return (redraw, line_no)
+			self.tab_window.diffWindows(window_1, window_2)
+			self.diff_window_list.append(window_2_name)
 
 	def handleCloseDiffs(self, line_no, action):
 		for window in self.diff_window_list:
@@ -297,7 +332,7 @@ class HistoryTreeFeature(Feature):
 		return (True, line_no)
 
 	def handleOpenCurrent(self, line_no, action):
-		item = self.source_tree.findItemWithColour(line_no, self.getOrder())
+		item = self.getLineNode(line_no)
 
 		if item is not None and item.getFlag() != 'D':
 			# always close the diffs.
@@ -312,7 +347,7 @@ class HistoryTreeFeature(Feature):
 	def handleCloseItem(self, line_no, action):
 		redraw = False
 
-		item = self.source_tree.findItemWithColour(line_no, self.getOrder())
+		item = self.getLineNode(line_no)
 
 		if item is not None:
 			if item.hasChild() and item.isOpen():
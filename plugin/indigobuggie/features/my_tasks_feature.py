@@ -207,7 +207,7 @@ class MyTasksFeature(Feature):
 					value.append( level*' ' + self.render_items[MyTasksFeature.MARKER_CLOSED]  + ' ' + node.name)
 					skip_children = True
 
-			node.colour = len(value)
+			self.setLineNode(node, len(value))
 
 		return (node, value, skip_children)
 
@@ -215,7 +215,7 @@ class MyTasksFeature(Feature):
 		if self.is_selected and self.current_window is not None:
 			contents = self.getHelp(self.keylist)
 
-			new_contents = self.tasks.walkTree(self.render_function)
+			new_contents = self.renderLines(self.tasks, self.render_function)
 
 			if new_contents == []:
 				contents += [' - No tasks found - ']
@@ -275,7 +275,7 @@ class MyTasksFeature(Feature):
 	def handleSelectItem(self, line_no, action):
 		redraw = False
 
-		item = self.tasks.findItemWithColour(line_no)
+		item = self.getLineNode(line_no)
 
 		if item is not None:
 			if item.hasChild() or item.__class__.__name__ == "Group":
@@ -289,7 +289,7 @@ class MyTasksFeature(Feature):
 	def handleToggleState(self, line_no, action):
 		redraw = False
 
-		item = self.tasks.findItemWithColour(line_no)
+		item = self.getLineNode(line_no)
 
 		if item is not None:
 			if not item.hasChild():
@@ -300,7 +300,7 @@ class MyTasksFeature(Feature):
 
 	def handleGoto(self, line_no, action):
 		redraw = False
-		item = self.tasks.findItemWithColour(line_no)
+		item = self.getLineNode(line_no)
 
 		if item is not None and item.__class__.__name__ == "Task":
 			file_name = item.getFileName()
@@ -325,7 +325,7 @@ class MyTasksFeature(Feature):
 	def handleNewTask(self, line_no, action):
 		redraw = False
 
-		item = self.tasks.findItemWithColour(line_no)
+		item = self.getLineNode(line_no)
 
 		if item is not None:
 			if item.__class__.__name__ == "Group":
@@ -410,7 +410,7 @@ class MyTasksFeature(Feature):
 	def handleNewTimer(self, line_no, action):
 		redraw = False
 
-		item = self.tasks.findItemWithColour(line_no)
+		item = self.getLineNode(line_no)
 
 		if item is not None:
 			if item.__class__.__name__ == "Group":
@@ -468,7 +468,7 @@ class MyTasksFeature(Feature):
 	def handleEditTask(self, line_no, action):
 		redraw = False
 
-		item = self.tasks.findItemWithColour(line_no)
+		item = self.getLineNode(line_no)
 
 		if item is not None and item.__class__.__name__ != "Group":
 			pass			# TODO: handle the edit.
@@ -479,7 +479,7 @@ class MyTasksFeature(Feature):
 	def handleCancelTask(self, line_no, action):
 		redraw = False
 
-		item = self.tasks.findItemWithColour(line_no)
+		item = self.getLineNode(line_no)
 
 		if item is not None and item.__class__.__name__ != "Group":
 			self.needs_saving = True
@@ -64,7 +64,7 @@ class NotesFeature(Feature):
 		else:
 			value.append('    ' + node.name)
 
-		node.colour = len(value)
+		self.setLineNode(node, len(value))
 
 		return (node, value, skip_children)
 
@@ -90,7 +90,7 @@ class NotesFeature(Feature):
 	def renderTree(self):
 		if self.current_window is not None:
 			contents = self.getHelp(self.keylist)
-			contents += self.notes.walkTree(self.render_function)
+			contents += self.renderLines(self.notes, self.render_function)
 			self.tab_window.setBufferContents(self.buffer_id, contents)
 
 	def addSubject(self, subject):
@@ -131,31 +131,6 @@ class NotesFeature(Feature):
 
 		return result
 
-	def findItemWithColour(self, colour):
-		""" Find the item in the tree with the specific colour.
-
-			Due to the nature of the search it is not recursive and does not need to
-			walk back up the tree.
-		"""
-		prev = self.notes
-
-		for item in self.notes.getChildren():
-			if item.colour == colour:
-				return item
-
-			elif item.colour > colour:
-				for note in prev.getChildren():
-					if note.colour == colour:
-						return note
-
-			prev = item
-
-		for note in prev.getChildren():
-			if note.colour == colour:
-				return note
-
-		return None
-
 	def openNote(self, subject_name, title, content):
 		window = self.tab_window.openFileWithContent('__ib_note__', content, readonly=False, replace=True, scratch=True)
 		self.tab_window.addEventHandler('BufLeave', 'NotesFeature', 'leave', True)
@@ -182,7 +157,7 @@ class NotesFeature(Feature):
 	def handleSelect(self, line_no, action):
 		result = False
 
-		item = self.findItemWithColour(line_no)
+		item = self.getLineNode(line_no)
 
 		if item is not None:
 			if type(item) == beorn_lib.notes.Subject:
@@ -197,7 +172,7 @@ class NotesFeature(Feature):
 	def handleAddNote(self, line_no, action):
 		result = False
 
-		item = self.findItemWithColour(line_no)
+		item = self.getLineNode(line_no)
 
 		if item is not None:
 			if type(item) == beorn_lib.notes.Subject:
@@ -28,6 +28,77 @@ from collections import namedtuple, OrderedDict
 
 MenuItem = namedtuple('MenuItem', ["getMenu", "updateConfig"])
 
+# classes for the values that are rebuilt from the server responses.
+decoded_classes = {}
+
+
+def decode_value(value):
+	""" Rebuild the value that was encoded by the scm server. Objects and
+		named tuples are rebuilt as named tuples with the same fields.
+	"""
+	if type(value) == list:
+		result = [decode_value(item) for item in value]
+
+	elif type(value) == dict:
+		if '__class__' in value and 'fields' in value:
+			fields = value['fields']
+			key = (value['__class__'], tuple(fields.keys()))
+
+			if key not in decoded_classes:
+				decoded_classes[key] = namedtuple(value['__class__'], fields.keys())
+
+			result = decoded_classes[key](**{name: decode_value(fields[name]) for name in fields})
+		else:
+			result = {}
+			for key in value:
+				result[key] = decode_value(value[key])
+	else:
+		result = value
+
+	return result
+
+
+def decode_changes(directories, encoded):
+	""" Decode a change list that was encoded by the server's PathTable """
+	result = []
+	dir_id = 0
+
+	if encoded != '':
+		for entry in encoded.split('\n'):
+			(delta, _, name) = entry[1:].partition('/')
+
+			if delta != '':
+				dir_id += int(delta)
+
+			if directories[dir_id] != '':
+				result.append(beorn_lib.scm.SCMStatus(directories[dir_id] + '/' + name, entry[0]))
+			else:
+				result.append(beorn_lib.scm.SCMStatus(name, entry[0]))
+
+	return result
+
+
+def run_request(scm, request, parameters):
+	""" Run the request locally, used when the server is not running. """
+	result = None
+
+	if request == 'history':
+		result = scm.getHistory(parameters['path'], max_entries=parameters.get('max_entries'))
+
+	elif request == 'file':
+		if parameters.get('version') is None:
+			result = scm.getFile(parameters['path'])
+		else:
+			result = scm.getFile(parameters['path'], parameters['version'])
+
+	elif request == 'patch':
+		result = scm.getPatch(parameters['version'])
+
+	elif request == 'commit_details':
+		result = scm.getCommitDetails(parameters['version'])
+
+	return result
+
 
 class SCMItem(object):
 	__slots__ = ('name', 'scm_type', 'path', 'scm', 'submodule', 'change_list')
@@ -50,6 +121,13 @@ class SCMFeature(Feature):
 		self.tab_window = None
 		self.polling_thread = None
 		self.scm_list = []
+		self.server_stats = {}
+		self.path_tables = {}
+		self.server_running = False
+		self.use_service = False
+		self.request_id = 0
+		self.pending_requests = {}
+		self.resyncs_requested = set()
 
 		self.cheap_lock = False
 
@@ -63,9 +141,24 @@ class SCMFeature(Feature):
 		if len(self.tab_window.getConfiguration('SCMFeature', 'enabled_scms')) > 0:
 			config = self.locateSCMs()
 
-			config_str = str(json.dumps(config))
+			# The shared server needs its own process to connect from.
+			self.use_service = (beorn_lib.config.Config.toBool(self.tab_window.getConfiguration('SCMFeature', 'use_service_host')) is True and
+								beorn_lib.config.Config.toBool(config['shared_server']) is not True)
+
+			if self.use_service:
+				self.server_running = self.tab_window.startService('scm', self.onServerMessage, config)
+			else:
+				config_str = str(json.dumps(config))
+
+				self.server_running = self.tab_window.startBackgroundServer('scm_server', self.onServerMessage, config_str)
 
-			self.tab_window.startBackgroundServer('scm_server', self.onServerMessage, config_str)
+	def sendServerMessage(self, message):
+		if self.use_service:
+			result = self.tab_window.sendServiceMessage('scm', message)
+		else:
+			result = self.tab_window.sendBackgroundServerMessage('scm_server', message)
+
+		return result
 
 	def getSCMByType(self, scm_type):
 		result = None
@@ -169,15 +262,25 @@ class SCMFeature(Feature):
 		poll_period = self.tab_window.getConfiguration('SCMFeature', 'poll_period')
 		server_period = self.tab_window.getConfiguration('SCMFeature', 'server_period')
 		number_history_items = self.tab_window.getConfiguration('SCMFeature', 'number_history_items')
+		max_workers = self.tab_window.getConfiguration('SCMFeature', 'max_workers')
+		min_poll_period = self.tab_window.getConfiguration('SCMFeature', 'min_poll_period')
+		max_poll_period = self.tab_window.getConfiguration('SCMFeature', 'max_poll_period')
+		shard_workers = self.tab_window.getConfiguration('SCMFeature', 'shard_workers')
+		adaptive_list = [(self.tab_window.getConfiguration('SCMFeature', 'adaptive_polling') in (True, 'True'), 'Adaptive Refresh')]
 
 		dialog_layout = [
 			beorn_lib.dialog.Element('ButtonList',{'name': 'preferred_scm',			'title':'Default SCM',			'x':4, 'y':1, 'width':64, 'items': scm_list, 'type': 'single'}),
 			beorn_lib.dialog.Element('TextField', {'name': 'poll_period',			'title':'  Local Refresh Time', 'x':4, 'y':len(scm_list) + 3, 'width':6,  'default': str(int(float(poll_period))) ,'input_type':'numeric'}),
 			beorn_lib.dialog.Element('TextField', {'name': 'server_check_period',	'title':' Server Refresh Time', 'x':4, 'y':len(scm_list) + 4, 'width':6,  'default': str(int(server_period)) ,'input_type':'numeric'}),
 			beorn_lib.dialog.Element('TextField', {'name': 'number_history_items',	'title':'Number History Items', 'x':4, 'y':len(scm_list) + 5, 'width':6,  'default': str(number_history_items) ,'input_type':'numeric'}),
-			beorn_lib.dialog.Element('ButtonList',{'name': 'enabled_scms',			'title':'  Enabled SCMs',		'x':4, 'y':(len(scm_list)) + 7, 'width':64, 'items': active_list, 'type': 'multiple'}),
-			beorn_lib.dialog.Element('Button', {'name': 'ok', 'title': 'OK', 'x': 25, 'y': len(scm_list) + 8 + len(button_list) + 2}),
-			beorn_lib.dialog.Element('Button', {'name': 'cancel', 'title': 'CANCEL', 'x': 36, 'y': len(scm_list) + 8 + len(button_list) + 2})
+			beorn_lib.dialog.Element('TextField', {'name': 'max_workers',			'title':'    Parallel Updates', 'x':4, 'y':len(scm_list) + 6, 'width':6,  'default': str(max_workers) ,'input_type':'numeric'}),
+			beorn_lib.dialog.Element('ButtonList',{'name': 'adaptive_polling',		'title':'',						'x':4, 'y':len(scm_list) + 7, 'width':64, 'items': adaptive_list, 'type': 'multiple'}),
+			beorn_lib.dialog.Element('TextField', {'name': 'min_poll_period',		'title':'    Min Refresh Time', 'x':4, 'y':len(scm_list) + 8, 'width':6,  'default': str(min_poll_period) ,'input_type':'numeric'}),
+			beorn_lib.dialog.Element('TextField', {'name': 'max_poll_period',		'title':'    Max Refresh Time', 'x':4, 'y':len(scm_list) + 9, 'width':6,  'default': str(max_poll_period) ,'input_type':'numeric'}),
+			beorn_lib.dialog.Element('TextField', {'name': 'shard_workers',			'title':'    Worker Processes', 'x':4, 'y':len(scm_list) + 10, 'width':6, 'default': str(shard_workers) ,'input_type':'numeric'}),
+			beorn_lib.dialog.Element('ButtonList',{'name': 'enabled_scms',			'title':'  Enabled SCMs',		'x':4, 'y':(len(scm_list)) + 11, 'width':64, 'items': active_list, 'type': 'multiple'}),
+			beorn_lib.dialog.Element('Button', {'name': 'ok', 'title': 'OK', 'x': 25, 'y': len(scm_list) + 12 + len(button_list) + 2}),
+			beorn_lib.dialog.Element('Button', {'name': 'cancel', 'title': 'CANCEL', 'x': 36, 'y': len(scm_list) + 12 + len(button_list) + 2})
 		]
 
 		return beorn_lib.Dialog(beorn_lib.dialog.DIALOG_TYPE_TEXT, dialog_layout)
@@ -212,6 +315,22 @@ class SCMFeature(Feature):
 			if 'number_history_items' in results:
 				self.tab_window.setConfiguration('SCMFeature', 'number_history_items', int(results['number_history_items']))
 
+			if 'max_workers' in results:
+				self.tab_window.setConfiguration('SCMFeature', 'max_workers', max(1, int(results['max_workers'])))
+
+			if 'shard_workers' in results:
+				self.tab_window.setConfiguration('SCMFeature', 'shard_workers', max(1, int(results['shard_workers'])))
+
+			if 'adaptive_polling' in results:
+				self.tab_window.setConfiguration('SCMFeature', 'adaptive_polling', results['adaptive_polling'][0])
+
+			if 'min_poll_period' in results and 'max_poll_period' in results:
+				min_poll_period = max(1, int(results['min_poll_period']))
+				max_poll_period = max(min_poll_period, int(results['max_poll_period']))
+
+				self.tab_window.setConfiguration('SCMFeature', 'min_poll_period', min_poll_period)
+				self.tab_window.setConfiguration('SCMFeature', 'max_poll_period', max_poll_period)
+
 			supported_list = beorn_lib.scm.getSupportedSCMs()
 			enabled_scms = []
 			if 'enabled_scms' in results:
@@ -259,6 +378,16 @@ class SCMFeature(Feature):
 				'poll_period': 60,
 				'server_period': 60*60,
 				'number_history_items': 10,
+				'use_file_watcher': True,
+				'use_fsmonitor': True,
+				'shared_server': False,
+				'use_service_host': True,
+				'max_workers': 4,
+				'shard_workers': 1,
+				'compact_messages': True,
+				'adaptive_polling': True,
+				'min_poll_period': 5,
+				'max_poll_period': 600,
 				'engines': engines}
 
 	def getSettingsMenu(self):
@@ -310,6 +439,17 @@ class SCMFeature(Feature):
 		result['poll_period'] = self.tab_window.getConfiguration('SCMFeature', 'poll_period')
 		result['server_period'] = self.tab_window.getConfiguration('SCMFeature', 'server_period')
 		result['enabled_scms'] = self.tab_window.getConfiguration('SCMFeature', 'enabled_scms')
+		result['use_file_watcher'] = self.tab_window.getConfiguration('SCMFeature', 'use_file_watcher')
+		result['use_fsmonitor'] = self.tab_window.getConfiguration('SCMFeature', 'use_fsmonitor')
+		result['shared_server'] = self.tab_window.getConfiguration('SCMFeature', 'shared_server')
+		result['max_workers'] = self.tab_window.getConfiguration('SCMFeature', 'max_workers')
+		result['shard_workers'] = self.tab_window.getConfiguration('SCMFeature', 'shard_workers')
+		result['compact_messages'] = self.tab_window.getConfiguration('SCMFeature', 'compact_messages')
+		result['adaptive_polling'] = self.tab_window.getConfiguration('SCMFeature', 'adaptive_polling')
+		result['min_poll_period'] = self.tab_window.getConfiguration('SCMFeature', 'min_poll_period')
+		result['max_poll_period'] = self.tab_window.getConfiguration('SCMFeature', 'max_poll_period')
+		result['snapshot_dir'] = self.makeResourceDir('scm_status')
+		result['filters'] = self.getServerFilters()
 		result['scm_config'] = {}
 
 		for fscm_type in result['enabled_scms']:
@@ -325,6 +465,27 @@ class SCMFeature(Feature):
 
 		return result
 
+	def getServerFilters(self):
+		""" The Source Tree ignore rules, the server drops the changes for
+			the ignored files so they are not sent.
+		"""
+		result = {}
+		result['ignore_suffixes'] = self.tab_window.getConfiguration('SourceTreeFeature', 'ignore_suffixes')
+		result['ignore_directories'] = self.tab_window.getConfiguration('SourceTreeFeature', 'ignore_directories')
+		result['hide_dot_files'] = self.tab_window.getConfiguration('SourceTreeFeature', 'hide_dot_files')
+		return result
+
+	def requestResync(self, root):
+		""" Ask the server for the whole state of the repository at root """
+		if self.server_running and root not in self.resyncs_requested:
+			self.resyncs_requested.add(root)
+			self.sendServerMessage(json.dumps({'request': 'resync', 'root': root}))
+
+	def updateServerFilters(self):
+		if self.server_running:
+			message = {'request': 'filters', 'filters': self.getServerFilters()}
+			self.sendServerMessage(json.dumps(message))
+
 	def getItemHistory(self, item):
 		result = (None, [])
 
@@ -379,6 +540,50 @@ class SCMFeature(Feature):
 
 		return result
 
+	def getServerStats(self, root):
+		""" Returns the number of status scans that the server has executed
+			and skipped for the repository at root.
+		"""
+		return self.server_stats.get(root, {'scans': 0, 'skipped': 0})
+
+	def sendRequest(self, request, scm, callback, parameters):
+		""" Ask the server to run the request against the scm. The callback
+			is called with the result (or None on failure) when the response
+			arrives. If the server is not running the request is run here and
+			the callback is called before this returns.
+		"""
+		sent = False
+
+		if self.server_running:
+			self.request_id += 1
+
+			message = dict(parameters)
+			message['request_id'] = self.request_id
+			message['request'] = request
+			message['root'] = scm.getRoot()
+			message['type'] = scm.getType()
+
+			self.pending_requests[self.request_id] = callback
+			sent = self.sendServerMessage(json.dumps(message))
+
+			if not sent:
+				del self.pending_requests[self.request_id]
+
+		if not sent:
+			callback(run_request(scm, request, parameters))
+
+	def requestHistory(self, scm, path, max_entries, callback):
+		self.sendRequest('history', scm, callback, {'path': path, 'max_entries': max_entries})
+
+	def requestFile(self, scm, path, version, callback):
+		self.sendRequest('file', scm, callback, {'path': path, 'version': version})
+
+	def requestPatch(self, scm, version, callback):
+		self.sendRequest('patch', scm, callback, {'version': version})
+
+	def requestCommitDetails(self, scm, version, callback):
+		self.sendRequest('commit_details', scm, callback, {'version': version})
+
 	def getCurrentBranch(self, scm):
 		result = ''
 
@@ -387,46 +592,110 @@ class SCMFeature(Feature):
 
 		return result
 
+	def handleServerMessage(self, items, render):
+		""" Handle a single message from the server. Returns True if the
+			message added a new SCM.
+		"""
+		result = False
+
+		if 'response_id' in items:
+			# answer to a request - these do not need the source tree.
+			callback = self.pending_requests.pop(items['response_id'], None)
+
+			if callback is not None:
+				if 'error' in items:
+					callback(None)
+				else:
+					callback(decode_value(items['result']))
+
+		elif self.source_tree_feature is not None:
+			if 'stats' in items:
+				self.server_stats[items['root']] = items['stats']
+
+			if 'changes' in items and items.get('encoding') == 'compact':
+				# the directories are only sent the first time they are used.
+				directories = self.path_tables.setdefault(items['root'], {})
+
+				for dir_id in items['dirs']:
+					directories[int(dir_id)] = items['dirs'][dir_id]
+
+				try:
+					items['changes'] = decode_changes(directories, items['changes'])
+					items['unchanged'] = decode_changes(directories, items['unchanged'])
+
+				except (KeyError, ValueError):
+					# a directory that was not defined, the whole state has to be sent again.
+					self.requestResync(items['root'])
+
+				else:
+					if items.get('resync', False):
+						self.resyncs_requested.discard(items['root'])
+
+					self.source_tree_feature.addToUpdateThread(items, render)
+
+			elif 'changes' in items:
+				# Change list needs adding.
+				change_list = []
+				unchanged_list = []
+				# need to covert to SCMStatus and convert from unicode to ascii/utf8
+				for item in items['changes']:
+					change_list.append(beorn_lib.scm.SCMStatus(item[0], item[1]))
+
+				for item in items['unchanged']:
+					unchanged_list.append(beorn_lib.scm.SCMStatus(item[0], item[1]))
+
+				# need utf8 - ascii so convert here.
+				items['type'] = items['type']
+				items['changes'] = change_list
+				items['unchanged'] = unchanged_list
+
+				self.source_tree_feature.addToUpdateThread(items, render)
+
+			elif 'url' in items:
+				# repo found in scan needs adding to tree.
+				new_scm = beorn_lib.scm.create(	items['type'],
+												working_dir=items['root'],
+												server_url=items['url'],
+												user_name=items['user_name'],
+												password=items['password'])
+
+				self.addSCM(items['type'], items['root'], new_scm, not items['primary'])
+
+				# the changes that follow in the batch need the scm node in the tree.
+				self.source_tree_feature.addToUpdateThread("scms_updated")
+				result = True
+
+		return result
+
 	def onServerMessage(self, message):
-		if self.source_tree_feature is not None:
+		self.tab_window.markTime('first_server_message')
+
+		for line in message.splitlines():
 			try:
-				for line in message.splitlines():
-					items = json.loads(line)
-
-					if 'changes' in items:
-						# Change list needs adding.
-						change_list = []
-						unchanged_list = []
-						# need to covert to SCMStatus and convert from unicode to ascii/utf8
-						for item in items['changes']:
-							change_list.append(beorn_lib.scm.SCMStatus(item[0], item[1]))
-
-						for item in items['unchanged']:
-							unchanged_list.append(beorn_lib.scm.SCMStatus(item[0], item[1]))
-
-						# need utf8 - ascii so convert here.
-						items['type'] = items['type']
-						items['changes'] = change_list
-						items['unchanged'] = unchanged_list
-
-						self.source_tree_feature.addToUpdateThread(items)
-
-					elif 'url' in items:
-						# repo found in scan needs adding to tree.
-						new_scm = beorn_lib.scm.create(	items['type'],
-														working_dir=items['root'],
-														server_url=items['url'],
-														user_name=items['user_name'],
-														password=items['password'])
-
-						self.addSCM(items['type'], items['root'], new_scm, not items['primary'])
-						self.source_tree_feature.addToUpdateThread("scms_updated")
+				items = json.loads(line)
 
 			except ValueError:
-				print("Decode Issue", message)
+				print("Decode Issue", line)
+				continue
+
+			if 'batch' in items:
+				# the messages from one server cycle - only render once at the end.
+				for sub_item in items['batch']:
+					self.handleServerMessage(sub_item, False)
+
+				if self.source_tree_feature is not None:
+					self.source_tree_feature.renderTree()
+			else:
+				self.handleServerMessage(items, True)
 
 	def close(self):
-		self.tab_window.stopBackgroundServer('scm_server')
+		if self.use_service:
+			self.tab_window.stopService('scm')
+		else:
+			self.tab_window.stopBackgroundServer('scm_server')
+
+		self.server_running = False
+		self.pending_requests = {}
 
 		super(SCMFeature, self).close()
 
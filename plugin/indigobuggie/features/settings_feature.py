@@ -322,7 +322,7 @@ class SettingsFeature(Feature):
 		else:
 			value.append(level*'  ' + marker + node.getName() + proj_marker)
 
-		node.colour = len(value)
+		self.setLineNode(node, len(value))
 
 		return (node, value, skip_children)
 
@@ -332,16 +332,16 @@ class SettingsFeature(Feature):
 				self.createSettingsMenu()
 
 			contents = self.getHelp(self.keylist)
-			contents += self.settings.walkTree(self.renderFunction)
+			contents += self.renderLines(self.settings, self.renderFunction)
 
 			self.tab_window.setBufferContents(self.buffer_id, contents)
 
 	def handleSelectItem(self, line_no, action):
 		redraw = False
-		item = self.settings.findItemWithColour(line_no)
+		item = self.getLineNode(line_no)
 
 		if item is not None:
-			if item.hasChild() and (self.settings.findItemWithColour(line_no-1) is not None or line_no == 1):
+			if item.hasChild() and (self.getLineNode(line_no-1) is not None or line_no == 1):
 				item.toggleOpen()
 				redraw = True
 
@@ -349,7 +349,7 @@ class SettingsFeature(Feature):
 				self.tab_window.showDialog(item)
 				redraw = True
 		else:
-			item_next = self.settings.findItemWithColour(line_no+1)
+			item_next = self.getLineNode(line_no+1)
 			if item_next is not None and item_next.hasChild() and item_next.isOpen():
 				item_next.toggleOpen()
 				redraw = True
@@ -358,7 +358,7 @@ class SettingsFeature(Feature):
 
 	def handleMoveToUser(self, line_no, action):
 		redraw = False
-		item = self.settings.findItemWithColour(line_no)
+		item = self.getLineNode(line_no)
 
 		if item is not None:
 			if self.user_config.find(*item.getKey()) is None:
@@ -372,7 +372,7 @@ class SettingsFeature(Feature):
 
 	def handleMoveToProject(self, line_no, action):
 		redraw = False
-		item = self.settings.findItemWithColour(line_no)
+		item = self.getLineNode(line_no)
 
 		if item is not None:
 			if self.project_config.find(*item.getKey()) is None:
@@ -21,18 +21,24 @@
 #---------------------------------------------------------------------------------
 
 import os
+import time
 import beorn_lib
 from .history_node import HistoryNode
 from .settings_node import SettingsNode
-from queue import Queue
+from .tree_monitor import TreeMonitor
+from .tree_scanner import TreeScanner
+from queue import Queue, Empty
 from .feature import Feature, KeyDefinition, UpdateItem
 from threading import Thread
-from collections import namedtuple as namedtuple
+from collections import namedtuple as namedtuple, OrderedDict
 
 BranchRef = namedtuple('BranchRef', ['line_no', 'scm', 'branch_name', 'version'])
 
 LINE_LEVEL_SPACE	= '  '
 
+# The longest time spent taking updates off the queue for one batch.
+UPDATE_BATCH_TIME	= 0.05
+
 # render markers
 MARKER_ADDED		= 0
 MARKER_DELETED		= 1
@@ -65,6 +71,7 @@ class SourceTreeFeature(Feature):
 	SOURCE_TREE_DIFF_FILE		= 9
 	SOURCE_TREE_CLOSE_ITEMS_ALL = 10
 	SOURCE_TREE_HISTORY_TREE	= 11
+	SOURCE_TREE_REFRESH			= 12
 
 	# System event IDs
 	SOURCE_TREE_FILE_LOADED_EVENT	= 1		# need to check for file changes.
@@ -89,7 +96,8 @@ class SourceTreeFeature(Feature):
 						KeyDefinition('d',		SourceTreeFeature.SOURCE_TREE_DIFF_FILE,		False,	self.handleDiffFileItem,	"Diff the file against the current head."),
 						KeyDefinition('x',		SourceTreeFeature.SOURCE_TREE_CLOSE_ITEM,		False,	self.handleCloseItem,		"Close the tree items."),
 						KeyDefinition('X',		SourceTreeFeature.SOURCE_TREE_CLOSE_ITEMS_ALL,	False,	self.handleCloseItemAll,	"Close all the parents of the item."),
-						KeyDefinition('c',		SourceTreeFeature.SOURCE_TREE_CODE_REVIEW,		False,	self.handleCodeReview,		"Create a Code review for the history Item.")
+						KeyDefinition('c',		SourceTreeFeature.SOURCE_TREE_CODE_REVIEW,		False,	self.handleCodeReview,		"Create a Code review for the history Item."),
+						KeyDefinition('R',		SourceTreeFeature.SOURCE_TREE_REFRESH,			False,	self.handleRefresh,			"Read the tree from the file system again.")
 					]
 
 		self.selectable = True
@@ -109,6 +117,16 @@ class SourceTreeFeature(Feature):
 		self.open_branches = []
 
 		self.created = False
+		self.scm_states = {}
+
+		# the open directories (path -> names and path -> node) from the last render.
+		self.tree_listings = {}
+		self.tree_nodes = {}
+		self.render_listings = {}
+		self.render_nodes = {}
+		self.tree_monitor = TreeMonitor(self.isFilteredEntry)
+		self.tree_scanner = TreeScanner(self.isFilteredEntry)
+		self.lazy_scan = False
 
 		self.update_queue = Queue()
 		self.update_thread = Thread(target=self.updateTreeThread, args=(self.update_queue,))
@@ -128,7 +146,8 @@ class SourceTreeFeature(Feature):
 
 		button_list = [	(self.tab_window.getConfiguration('SourceTreeFeature', 'hide_dot_files') == 'True',		"Hide Dot files."),
 						(self.tab_window.getConfiguration('SourceTreeFeature', 'show_hidden_files') == 'True',	"Show hidden files."),
-						(self.tab_window.getConfiguration('SourceTreeFeature', 'follow_current_file') == 'True',"Show the current file in the source tree.") ]
+						(self.tab_window.getConfiguration('SourceTreeFeature', 'follow_current_file') == 'True',"Show the current file in the source tree."),
+						(self.tab_window.getConfiguration('SourceTreeFeature', 'lazy_scan') == 'True',			"Only read directories when they are opened.") ]
 
 		dialog_layout = [
 			beorn_lib.dialog.Element('TextField', {'name': 'ignore_suffixes',		'title': 'Suffix Ignore List   ',	'x': 10,	'y': 1, 'default': suffix_string_list}),
@@ -160,6 +179,20 @@ class SourceTreeFeature(Feature):
 		self.tab_window.setConfiguration('SourceTreeFeature', 'hide_dot_files',		 results['settings'][0])
 		self.tab_window.setConfiguration('SourceTreeFeature', 'show_hidden_files',	 results['settings'][1])
 		self.tab_window.setConfiguration('SourceTreeFeature', 'follow_current_file', results['settings'][2])
+		self.tab_window.setConfiguration('SourceTreeFeature', 'lazy_scan',			 results['settings'][3])
+
+		lazy_scan = results['settings'][3] in (True, 'True')
+
+		if self.lazy_scan and not lazy_scan:
+			# the closed directories have not been read yet.
+			self.update_queue.put(UpdateItem("tree_update", None, None, (self.tree_listings, self.tree_nodes)))
+
+		self.lazy_scan = lazy_scan
+
+		scm_feature = self.tab_window.getFeature('SCMFeature')
+
+		if scm_feature is not None:
+			scm_feature.updateServerFilters()
 
 	def getDefaultConfiguration(self):
 		return	{	'ignore_suffixes': ['swp', 'swn', 'swo', 'pyc', 'o'],
@@ -167,7 +200,8 @@ class SourceTreeFeature(Feature):
 					'display_order': SourceTreeFeature.SOURCE_TREE_DISPLAY_ORDER_NORMAL,
 					'hide_dot_files': True,
 					'show_hidden_files': False,
-					'follow_current_file': True}
+					'follow_current_file': True,
+					'lazy_scan': True}
 
 	def getSettingsMenu(self):
 		return SettingsNode('Source Tree', 'SourceTreeFeature', None, self.getDialog, self.resultsFunction)
@@ -178,9 +212,107 @@ class SourceTreeFeature(Feature):
 	def getOrder(self):
 		return int(self.tab_window.getConfiguration('SourceTreeFeature', 'display_order'))
 
+	def hideDotFiles(self):
+		""" The dialog stores the setting as the string 'True' or 'False' """
+		return self.tab_window.getConfiguration('SourceTreeFeature', 'hide_dot_files') in (True, 'True')
+
+	def isFilteredEntry(self, name, is_dir):
+		if name.startswith('.') and self.hideDotFiles():
+			result = True
+		elif is_dir:
+			result = name in self.ignore_directories
+		else:
+			result = self.source_tree.isSuffixFiltered(name)
+
+		return result
+
+	def readTree(self):
+		""" Read the whole tree with the parallel scanner, or only the top of
+			it when lazy as the directories are read when they are opened.
+		"""
+		root_path = os.path.abspath(self.source_tree.getPath(True))
+
+		if self.lazy_scan:
+			result = self.tree_monitor.check({root_path: set()})
+		else:
+			result = [(path, names, ()) for (path, names) in self.tree_scanner.scan(root_path)]
+
+		return result
+
+	def readDirectories(self, item):
+		""" Do the file system reads for an update. These are done outside of
+			the tree lock, so the render does not wait on the file system.
+
+			Returns a list of (directory, added names, removed names) for
+			mergeDirectories, or None if the update does not read anything.
+		"""
+		result = None
+
+		if item.status == "tree_check":
+			result = self.tree_monitor.check(item.change[0])
+
+		elif item.status == "scan_directory":
+			result = self.tree_monitor.check({os.path.abspath(item.change.getPath(True)): set()})
+
+		elif item.status == "tree_update" and self.lazy_scan:
+			# only the directories that have been opened are read again.
+			self.tree_monitor.reset()
+			result = self.tree_monitor.check(item.change[0])
+
+		elif item.status in ("tree_update", "tree_scan"):
+			result = self.readTree()
+
+		return result
+
+	def mergeDirectories(self, directories, nodes):
+		""" Apply the directories read by readDirectories to the tree. nodes is
+			directory -> node for the directories that are already known.
+		"""
+		result = False
+		root_path = os.path.abspath(self.source_tree.getPath(True))
+
+		for (path, added, removed) in directories:
+			node = nodes.get(path)
+
+			if node is None and path == root_path:
+				node = self.source_tree
+
+			elif node is None and path.startswith(root_path + os.sep):
+				node = self.source_tree.findItemNode(os.path.relpath(path, root_path))
+
+			if node is not None:
+				result = self.updateDirectory(node, added, removed) or result
+
+		return result
+
+	def updateDirectory(self, node, added, removed):
+		""" Add and remove the entries of a directory that has changed """
+		result = False
+
+		for name in added:
+			if node.findItemNode(name) is None:
+				node.addTreeNodeByPath(name)
+				result = True
+
+		for name in removed:
+			entry = node.findItemNode(name)
+
+			# the items that the scm has a state for (deleted files) are kept.
+			if entry is not None and not entry.hasState() and entry.getFlag() is None:
+				entry.deleteNode(True)
+				result = True
+
+		return result
+
+	def getSCMStates(self, scm_root, scm_name):
+		""" The path -> status of the items that have a state for the scm """
+		return self.scm_states.setdefault((os.path.abspath(scm_root), scm_name), {})
+
 	def clearSourceTreeChange(self, scm_root, scm_name, change_item):
 		result = False
 
+		self.getSCMStates(scm_root, scm_name).pop(change_item.path, None)
+
 		scm_root_item = self.source_tree.findItemNode(scm_root)
 
 		if scm_root_item is not None:
@@ -214,6 +346,7 @@ class SourceTreeFeature(Feature):
 
 			if entry is not None:
 				entry.updateItemState(scm_name, change_item)
+				self.getSCMStates(scm_root, scm_name)[change_item.path] = change_item.status
 				result = True
 			else:
 				# TODO: log that path could not be added
@@ -221,6 +354,25 @@ class SourceTreeFeature(Feature):
 
 		return result
 
+	def resyncSourceTree(self, scm_root, scm_name, changes):
+		""" Replace all the states of the scm with the changes. Only the items
+			that are not the same as the current state are updated.
+		"""
+		states = self.getSCMStates(scm_root, scm_name)
+
+		new_states = {}
+		for change_item in changes:
+			new_states[change_item.path] = change_item
+
+		for path in [path for path in states if path not in new_states]:
+			self.clearSourceTreeChange(scm_root, scm_name, beorn_lib.scm.SCMStatus(path, states[path]))
+
+		for path in new_states:
+			if states.get(path) != new_states[path].status:
+				self.updateSourceTree(scm_root, scm_name, new_states[path])
+
+		return True
+
 	def updateSourceTreeNodeAsSCM(self, scm_root, scm, submodule):
 		result = False
 		scm_root_item = self.source_tree.findItemNode(os.path.abspath(scm_root))
@@ -235,10 +387,18 @@ class SourceTreeFeature(Feature):
 
 		return result
 
-	def addToUpdateThread(self, scm_change):
+	def addToUpdateThread(self, scm_change, render=True):
 		if type(scm_change) == str and scm_change == "scms_updated":
 			# need to loop through the tree to update nodes that are SCMs
 			self.update_queue.put(UpdateItem("scms_updated", None, None, None))
+
+		elif scm_change.get('resync', False):
+			# the whole state of the repository, update it in one go.
+			changes = [change for change in scm_change['changes'] if not self.source_tree.isSuffixFiltered(change.path)]
+			self.update_queue.put(UpdateItem("resync", os.path.abspath(scm_change['root']), scm_change['type'], changes))
+
+			if render:
+				self.renderTree()
 		else:
 			# schedule and update for the SCM
 			for change in scm_change['changes']:
@@ -249,46 +409,132 @@ class SourceTreeFeature(Feature):
 			for unchanged in scm_change['unchanged']:
 				self.update_queue.put(UpdateItem("cleared", scm_change['root'], scm_change['type'], unchanged))
 
-			self.renderTree()
+			if render:
+				self.renderTree()
+
+	def getUpdateBatch(self, queue):
+		""" Wait for an update, then take the ones queued behind it for up to
+			UPDATE_BATCH_TIME. Only the last update for a path is kept, and a
+			resync replaces the updates for its repository that came before it.
+		"""
+		batch = OrderedDict()
+
+		item = queue.get()
+		end_time = time.time() + UPDATE_BATCH_TIME
+
+		while item is not None:
+			if item.status in ('scm_update', 'cleared'):
+				key = ('path', os.path.abspath(item.scm_root), item.scm_name, item.change.path)
+
+			elif item.status == 'scan_directory':
+				key = ('scan_directory', id(item.change))
+
+			elif item.status == 'resync':
+				key = ('resync', os.path.abspath(item.scm_root), item.scm_name)
+
+				for old_key in [old_key for old_key in batch if old_key[0] == 'path' and old_key[1:3] == key[1:]]:
+					del batch[old_key]
+			else:
+				key = (item.status,)
+
+			# re-added, so the order is that of the last update. Except the scms
+			# update, the updates queued after the first one need the scm nodes.
+			if key != ('scms_updated',) or key not in batch:
+				batch.pop(key, None)
+				batch[key] = item
+
+			if item.status == 'exit' or time.time() >= end_time:
+				break
+
+			try:
+				item = queue.get_nowait()
+			except Empty:
+				item = None
+
+		return list(batch.values())
+
+	def applyUpdate(self, item, directories=None):
+		""" Returns True if the tree needs redrawing. directories is what
+			readDirectories read for the item.
+		"""
+		result = False
+
+		if item.status in ("tree_check", "tree_update", "scan_directory", "tree_scan"):
+			if item.status == "scan_directory":
+				nodes = {os.path.abspath(item.change.getPath(True)): item.change}
+			elif item.change is not None:
+				nodes = item.change[1]
+			else:
+				nodes = {}
+
+			result = self.mergeDirectories(directories or [], nodes)
+
+			if item.status == "tree_update":
+				self.source_tree.prune()
+				result = True
+
+		elif item.status == "scm_update":
+			result = self.updateSourceTree(item.scm_root, item.scm_name, item.change)
+
+		elif item.status == "resync":
+			result = self.resyncSourceTree(item.scm_root, item.scm_name, item.change)
+
+		elif item.status == "cleared":
+			self.clearSourceTreeChange(item.scm_root, item.scm_name, item.change)
+			result = True
+
+		elif item.status == "scms_updated":
+			scm_feature = self.tab_window.getFeature('SCMFeature')
+
+			if scm_feature is not None:
+				for scm in scm_feature.listSCMs():
+					self.updateSourceTreeNodeAsSCM(scm.path, scm.scm, scm.submodule)
+
+				# the tree may have been rebased to the scms, read it once for all
+				# of them. This is read in the next batch, outside of the lock.
+				self.update_queue.put(UpdateItem("tree_scan", None, None, None))
+
+				result = True
+
+		return result
 
 	def updateTreeThread(self, queue):
 		""" Update the tree from another feature.
 			It expects a queue of UpdateItem items. It will use the "status" flag
 			as what to do with the update. Currently "exit" will exit and "update"
 			will updated the tree entry.
+
+			The updates are applied in batches (see getUpdateBatch). The file
+			system is read for the whole batch first, then the batch is applied
+			under the tree lock and asks for one redraw. So the render only
+			waits for the changes to the tree.
 		"""
-		redraw = False
+		item = UpdateItem("tree_scan", None, None, None)
+		directories = self.readDirectories(item)
+
+		with self.tab_window.tree_lock:
+			self.applyUpdate(item, directories)
 
-		self.source_tree.update()
 		self.created = True
 
-		while (True):
-			item = queue.get()
+		running = True
 
-			if item.status == 'exit':
-				break
+		while running:
+			redraw = False
 
-			elif item.status == "tree_update":
-				# TODO: may need to time limit these so they don't happen too often.
-				self.source_tree.update()
-				self.source_tree.prune()
-				self.needs_redraw = True
-
-			elif item.status == "scm_update":
-				self.needs_redraw = self.updateSourceTree(item.scm_root, item.scm_name, item.change)
+			batch = self.getUpdateBatch(queue)
+			reads = [self.readDirectories(item) for item in batch]
 
-			elif item.status == "cleared":
-				self.clearSourceTreeChange(item.scm_root, item.scm_name, item.change) or redraw
-				self.needs_redraw = True
+			with self.tab_window.tree_lock:
+				for (item, directories) in zip(batch, reads):
+					if item.status == 'exit':
+						running = False
+						break
 
-			elif item.status == "scms_updated":
-				scm_feature = self.tab_window.getFeature('SCMFeature')
+					redraw = self.applyUpdate(item, directories) or redraw
 
-				if scm_feature is not None:
-					for scm in scm_feature.listSCMs():
-						self.updateSourceTreeNodeAsSCM(scm.path, scm.scm, scm.submodule)
-						self.source_tree.update()
-						self.needs_redraw = True
+			if redraw:
+				self.needs_redraw = True
 
 	def initialise(self, tab_window):
 		result = super(SourceTreeFeature, self).initialise(tab_window)
@@ -298,6 +544,7 @@ class SourceTreeFeature(Feature):
 
 		self.ignore_suffixes = tab_window.getConfiguration('SourceTreeFeature', 'ignore_suffixes')
 		self.ignore_directories = tab_window.getConfiguration('SourceTreeFeature', 'ignore_directories')
+		self.lazy_scan = tab_window.getConfiguration('SourceTreeFeature', 'lazy_scan') in (True, 'True')
 
 		if directory == '.':
 			self.root_directory = os.path.abspath(directory)
@@ -392,7 +639,7 @@ class SourceTreeFeature(Feature):
 		if value is None:
 			value = []
 
-		if self.tab_window.getConfiguration('SourceTreeFeature', 'hide_dot_files') and node.getName() != '' and node.getName()[0] == '.':
+		if self.hideDotFiles() and node.getName() != '' and node.getName()[0] == '.':
 			# Ignore this file/directory and it's children as it is a .dot file and we are ignoring them.
 			skip_children = True
 		else:
@@ -401,13 +648,28 @@ class SourceTreeFeature(Feature):
 				(skip_children, line) = self.renderHistoryItem(level, node)
 			else:
 				(skip_children, line) = self.renderTreeItem(level, node)
+				self.addToListing(node)
 
 			if level > 0:
 				value.append(line)
-				node.colour = len(value)
+				self.setLineNode(node, len(value))
 
 		return (node, value, skip_children)
 
+	def addToListing(self, node):
+		""" Record the entries of the open directories, these are the ones
+			that are checked for changes.
+		"""
+		parent = node.getParent()
+
+		if parent is not None and type(parent) != HistoryNode:
+			self.render_listings.setdefault(os.path.abspath(parent.getPath(True)), set()).add(node.getName())
+
+		if node.isDir() and node.isOpen():
+			path = os.path.abspath(node.getPath(True))
+			self.render_listings.setdefault(path, set())
+			self.render_nodes[path] = node
+
 	def rebaseTree(self, new_base):
 		self.source_tree = self.source_tree.rebaseTree(new_base)
 		return self.source_tree.getPath()
@@ -422,7 +684,16 @@ class SourceTreeFeature(Feature):
 
 				contents = self.getHelp(self.keylist)
 				if self.created is True:
-					contents += self.source_tree.walkTree(self.all_nodes_scm_function, self.getOrder())
+					self.render_listings = {}
+					self.render_nodes = {}
+
+					with self.tab_window.tree_lock:
+						contents += self.renderLines(self.source_tree, self.all_nodes_scm_function, self.getOrder())
+
+					(self.tree_listings, self.tree_nodes) = (self.render_listings, self.render_nodes)
+
+					if any(len(states) > 0 for states in list(self.scm_states.values())):
+						self.tab_window.markTime('first_markers')
 
 					scm_feature = self.tab_window.getFeature('SCMFeature')
 
@@ -456,12 +727,17 @@ class SourceTreeFeature(Feature):
 	def openTreeToFile(self, path):
 		entry = self.source_tree.findItemNode(path)
 
+		if entry is None and self.lazy_scan and path.startswith(self.source_tree.getPath() + os.sep) and os.path.exists(path):
+			# the directory has not been read yet, add the file on its own.
+			with self.tab_window.tree_lock:
+				entry = self.source_tree.addTreeNodeByPath(path)
+
 		if entry is not None:
 			self.renderTree()
 			self.setMenuPosition(entry.getColour() + 1)
 
 	def handleOpenHistoryItem(self, line_no, action):
-		item = self.source_tree.findItemWithColour(line_no, self.getOrder())
+		item = self.getLineNode(line_no)
 		version = None
 
 		if item is not None:
@@ -476,11 +752,26 @@ class SourceTreeFeature(Feature):
 					version = scm.getCurrentVersion()
 
 			if version is not None and version != 'none':
-				contents = scm.getFile(parent.getPath(True), version)
-				self.tab_window.openFileWithContent(version + ':' + parent.getName(), contents, readonly=True)
+				name = version + ':' + parent.getName()
+				self.requestFile(scm, parent.getPath(True), version, lambda contents: self.showFileContents(name, contents))
 
 		return (False, line_no)
 
+	def requestFile(self, scm, path, version, callback):
+		""" The file is fetched by the scm server so vim does not wait for it """
+		scm_feature = self.tab_window.getFeature('SCMFeature')
+
+		if scm_feature is not None:
+			scm_feature.requestFile(scm, path, version, callback)
+		elif version is None:
+			callback(scm.getFile(path))
+		else:
+			callback(scm.getFile(path, version))
+
+	def showFileContents(self, name, contents):
+		if type(contents) == list:
+			self.tab_window.openFileWithContent(name, contents, readonly=True)
+
 	def openDiff(self, scm, item, version):
 		file_path = item.getPath(True)
 
@@ -489,8 +780,11 @@ class SourceTreeFeature(Feature):
 
 		self.diff_file_path = file_path
 
-		contents = scm.getFile(item.getPath(True), version)
-		if contents is not None:
+		self.requestFile(scm, file_path, version, lambda contents: self.showDiff(file_path, version, contents))
+
+	def showDiff(self, file_path, version, contents):
+		# the user may have moved on to another file before the contents arrived.
+		if contents is not None and file_path == self.diff_file_path:
 			window_1 = self.tab_window.openFile(file_path)
 
 			window_2_name = version + ':' + os.path.basename(file_path)
@@ -501,7 +795,7 @@ class SourceTreeFeature(Feature):
 	def handleSelectItem(self, line_no, action):
 		redraw = False
 
-		item = self.source_tree.findItemWithColour(line_no, self.getOrder())
+		item = self.getLineNode(line_no)
 
 		if item is not None:
 			if type(item) == HistoryNode and item.getSCM() is not None:
@@ -511,6 +805,9 @@ class SourceTreeFeature(Feature):
 				item.toggleOpen()
 				redraw = True
 
+				if self.lazy_scan and item.isOpen():
+					self.update_queue.put(UpdateItem("scan_directory", None, None, item))
+
 			elif item.isOnFileSystem():
 				self.handleCloseDiffs(0, 0)
 				self.tab_window.openFile(item.getPath(True))
@@ -533,11 +830,8 @@ class SourceTreeFeature(Feature):
 				if scm is not None:
 					scm_item = item.getState(scm.getType())
 					if scm_item is not None and scm_item.status != 'D':
-						path = item.getPath(True)
-						contents = scm.getFile(path)
-
-						if type(contents) == list:
-							self.tab_window.openFileWithContent(item.getVersion() + ':' + item.getParent().getName(), contents, readonly=True)
+						name = item.getVersion() + ':' + item.getParent().getName()
+						self.requestFile(scm, item.getPath(True), None, lambda contents: self.showFileContents(name, contents))
 		else:
 			# Ok, let's check to see if the keypress is in the branch list.
 			if line_no >= self.branch_start:
@@ -576,7 +870,7 @@ class SourceTreeFeature(Feature):
 	def handleDiffFileItem(self, line_no, action):
 		redraw = False
 
-		item = self.source_tree.findItemWithColour(line_no, self.getOrder())
+		item = self.getLineNode(line_no)
 
 		if item is not None:
 			if type(item) == HistoryNode:
@@ -609,7 +903,7 @@ class SourceTreeFeature(Feature):
 	def handleCloseItem(self, line_no, action):
 		redraw = False
 
-		item = self.source_tree.findItemWithColour(line_no, self.getOrder())
+		item = self.getLineNode(line_no)
 
 		if item is not None:
 			if item.hasChild() and item.isOpen():
@@ -629,7 +923,7 @@ class SourceTreeFeature(Feature):
 
 	def handleCloseItemAll(self, line_no, action):
 		redraw = False
-		item = self.source_tree.findItemWithColour(line_no, self.getOrder())
+		item = self.getLineNode(line_no)
 
 		if item is not None and item is not None:
 			if item.hasChild() and item.isOpen():
@@ -652,7 +946,7 @@ class SourceTreeFeature(Feature):
 
 	def handleItemHistoryAll(self, line_no, action):
 		redraw = False
-		item = self.source_tree.findItemWithColour(line_no, self.getOrder())
+		item = self.getLineNode(line_no)
 
 		if item is not None and not item.isDir():
 			if item.isOpen():
@@ -672,8 +966,6 @@ class SourceTreeFeature(Feature):
 
 				number_history_items = self.tab_window.getConfiguration('SCMFeature', 'number_history_items')
 
-				history = []
-
 				scm_feature = self.tab_window.getFeature('SCMFeature')
 
 				if scm_feature is not None:
@@ -681,17 +973,23 @@ class SourceTreeFeature(Feature):
 						status = item.getState(scm_item.scm_type)
 
 						if status is None or status.status != "A":
-							history = scm_item.scm.getHistory(path, max_entries=number_history_items)
-
-							if history is not None:
-								for h_item in history:
-									item.addChildNode(HistoryNode(h_item, scm_item.scm), mode=beorn_lib.NestedTreeNode.INSERT_END)
+							scm_feature.requestHistory(scm_item.scm, path, number_history_items, self.makeHistoryAllCallback(item, scm_item.scm))
 
 		return (redraw, line_no)
 
+	def makeHistoryAllCallback(self, item, scm):
+		def callback(history):
+			if history is not None:
+				for h_item in history:
+					item.addChildNode(HistoryNode(h_item, scm), mode=beorn_lib.NestedTreeNode.INSERT_END)
+
+				self.renderTree()
+
+		return callback
+
 	def handleHistoryTree(self, line_no, action):
 		redraw = False
-		item = self.source_tree.findItemWithColour(line_no, self.getOrder())
+		item = self.getLineNode(line_no)
 
 		if item is not None and not item.isDir():
 			if type(item) == HistoryNode and item.getSCM() is not None:
@@ -715,7 +1013,7 @@ class SourceTreeFeature(Feature):
 
 	def handleItemHistory(self, line_no, action):
 		redraw = False
-		item = self.source_tree.findItemWithColour(line_no, self.getOrder())
+		item = self.getLineNode(line_no)
 
 		if item is not None and not item.isDir():
 			if item.isOpen():
@@ -735,23 +1033,7 @@ class SourceTreeFeature(Feature):
 
 					if scm is not None:
 						number_history_items = self.tab_window.getConfiguration('SCMFeature', 'number_history_items')
-						history = scm.getHistory(item.getPath(True), max_entries=number_history_items)
-
-						if history != [] and history is not None:
-							redraw = True
-
-							item.deleteChildren()
-
-							for h_item in history:
-								item.addChildNode(HistoryNode(h_item, scm), mode=beorn_lib.NestedTreeNode.INSERT_END)
-						else:
-							item.deleteChildren()
-							dummy_item = beorn_lib.scm.HistoryItem('none', 'No History in ' + active_scm, 0, None, None)
-							item.addChildNode(HistoryNode(dummy_item, scm), mode=beorn_lib.NestedTreeNode.INSERT_END)
-
-						item.setLeaf(True)
-						item.setOpen(True)
-						redraw = True
+						scm_feature.requestHistory(scm, item.getPath(True), number_history_items, lambda history: self.showItemHistory(item, scm, active_scm, history))
 					else:
 						item.deleteChildren()
 						dummy_item = beorn_lib.scm.HistoryItem('none', 'SCM Not active:' + active_scm, 0, None, None)
@@ -762,20 +1044,42 @@ class SourceTreeFeature(Feature):
 
 		return (redraw, line_no)
 
+	def showItemHistory(self, item, scm, active_scm, history):
+		item.deleteChildren()
+
+		if history != [] and history is not None:
+			for h_item in history:
+				item.addChildNode(HistoryNode(h_item, scm), mode=beorn_lib.NestedTreeNode.INSERT_END)
+		else:
+			dummy_item = beorn_lib.scm.HistoryItem('none', 'No History in ' + active_scm, 0, None, None)
+			item.addChildNode(HistoryNode(dummy_item, scm), mode=beorn_lib.NestedTreeNode.INSERT_END)
+
+		item.setLeaf(True)
+		item.setOpen(True)
+		self.renderTree()
+
 	def handleShowPatch(self, line_no, action):
-		item = self.source_tree.findItemWithColour(line_no, self.getOrder())
+		item = self.getLineNode(line_no)
 		self.handleCloseDiffs(0, 0)
 
 		if item is not None and type(item) == HistoryNode and item.getSCM() is not None:
-			contents = item.getSCM().getPatch(item.getVersion())
+			scm_feature = self.tab_window.getFeature('SCMFeature')
 
-			if contents is not None and contents != '':
-				self.tab_window.openFileWithContent(item.getVersion() + '.patch', contents, readonly=True)
+			version = item.getVersion()
+
+			if scm_feature is not None:
+				scm_feature.requestPatch(item.getSCM(), version, lambda contents: self.showPatch(version, contents))
+			else:
+				self.showPatch(version, item.getSCM().getPatch(version))
 
 		return (False, line_no)
 
+	def showPatch(self, version, contents):
+		if contents is not None and contents != '':
+			self.tab_window.openFileWithContent(version + '.patch', contents, readonly=True)
+
 	def handleCodeReview(self, line_no, action):
-		item = self.source_tree.findItemWithColour(line_no, self.getOrder())
+		item = self.getLineNode(line_no)
 
 		if item is not None and type(item) == HistoryNode and item.getSCM() is not None:
 			code_reviews = self.tab_window.getFeature('CodeReviewFeature')
@@ -785,6 +1089,10 @@ class SourceTreeFeature(Feature):
 
 		return (False, line_no)
 
+	def handleRefresh(self, line_no, action):
+		self.update_queue.put(UpdateItem("tree_update", None, None, (self.tree_listings, self.tree_nodes)))
+		return (False, line_no)
+
 	def onMouseClick(self, line, col):
 		(redraw, line_no) = self.handleSelectItem(line, 0)
 		if redraw:
@@ -796,7 +1104,8 @@ class SourceTreeFeature(Feature):
 		tab = self.tab_window.tab_control.getCurrentTab()
 
 		if tab is not None and tab.ident == self.tab_window.ident:
-			self.update_queue.put(UpdateItem("tree_update", None, None, None))
+			# only the open directories that have changed are read.
+			self.update_queue.put(UpdateItem("tree_check", None, None, (self.tree_listings, self.tree_nodes)))
 
 			if self.needs_redraw:
 				self.renderTree()
@@ -824,8 +1133,7 @@ class SourceTreeFeature(Feature):
 				if name is not None and name != '':
 					self.openTreeToFile(name)
 		else:
-			# for now update the tree - and kick off a tree update.
-			self.update_queue.put(UpdateItem("tree_update", None, None, None))
+			self.update_queue.put(UpdateItem("tree_check", None, None, (self.tree_listings, self.tree_nodes)))
 
 	def select(self):
 		super(SourceTreeFeature, self).select()
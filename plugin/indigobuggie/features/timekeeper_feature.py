@@ -21,6 +21,7 @@
 #---------------------------------------------------------------------------------
 
 import os
+import json
 import time
 import beorn_lib
 from threading import Thread, Event
@@ -55,6 +56,9 @@ class TimeKeeperFeature(Feature):
 		self.stopped_typing = 0
 		self.started_typing = 0
 		self.timer_task = None
+		self.use_service = False
+		self.service_root = None
+		self.current_version = None
 
 		self.keylist = [KeyDefinition('<cr>', 	TimeKeeperFeature.TIME_KEEPER_SELECT,				False,	self.handleSelectItem,		"Select item."),
 						KeyDefinition('p', 		TimeKeeperFeature.TIME_KEEPER_ADD_PROJECT,			False,	self.handleAddProject,		"Add a project to timekeeper."),
@@ -119,11 +123,16 @@ class TimeKeeperFeature(Feature):
 
 			self.closedown = Event()
 
-			# Issue: This needs to be a process.
-			# Also poll_period needs to be in the config.
+			# Issue: poll_period needs to be in the config.
 			if beorn_lib.config.Config.toBool(tab_window.getConfiguration('TimeKeeperFeature', 'use_repo')) is True:
 				if self.tab_window.getFeature('SCMFeature') is not None:
 					self.poll_period = 36
+
+					# If the service finds the repository it watches the version, and
+					# vim stops polling the repo.
+					root = os.path.abspath(tab_window.getConfiguration('SettingsFeature', 'root_directory'))
+					self.use_service = self.tab_window.startService('timekeeper', self.onServiceMessage, {'root': root, 'poll_period': self.poll_period})
+
 					self.timer_task = Thread(target=self.polling_scm_function)
 					self.timer_task.start()
 
@@ -137,11 +146,30 @@ class TimeKeeperFeature(Feature):
 
 		return result
 
+	def getServiceVersion(self):
+		""" Returns the version from the service, if the service is watching
+			the same repository as the active scm, else None.
+		"""
+		result = None
+		scm_feature = self.tab_window.getFeature('SCMFeature')
+
+		if self.service_root is not None and scm_feature is not None:
+			scm = scm_feature.getActiveScm()
+
+			if scm is not None and scm.getType() == 'Git' and os.path.realpath(scm.getRoot()) == self.service_root:
+				result = self.current_version
+
+		return result
+
 	def getJobName(self):
 		result =  self.tab_window.getConfiguration('TimeKeeperFeature', 'default_job')
 		scm_feature = self.tab_window.getFeature('SCMFeature')
+		version = self.getServiceVersion()
 
-		if scm_feature is not None:
+		if version is not None:
+			result = version
+
+		elif scm_feature is not None:
 			scm = scm_feature.getActiveScm()
 
 			if scm is not None:
@@ -260,20 +288,20 @@ class TimeKeeperFeature(Feature):
 				value.append( level*' ' + self.render_items[MARKER_CLOSED]  + ' ' + node.name)
 				skip_children = True
 
-		node.colour = len(value)
+		self.setLineNode(node, len(value))
 
 		return (node, value, skip_children)
 
 	def renderTree(self):
 		if self.is_selected and self.current_window is not None:
 			contents = self.getHelp(self.keylist)
-			contents += self.timekeeper.walkTree(self.render_function)
+			contents += self.renderLines(self.timekeeper, self.render_function)
 			self.tab_window.setBufferContents(self.buffer_id, contents)
 
 	def handleSelectItem(self, line_no, action):
 		redraw = False
 
-		item = self.timekeeper.findItemWithColour(line_no)
+		item = self.getLineNode(line_no)
 
 		if item is not None:
 			item.toggleOpen()
@@ -294,7 +322,7 @@ class TimeKeeperFeature(Feature):
 	def handleAddJob(self, line_no, action):
 		redraw = False
 
-		item = self.timekeeper.findItemWithColour(line_no)
+		item = self.getLineNode(line_no)
 
 		if item is not None and type(item) == beorn_lib.Project:
 			new_job = self.tab_window.getUserInput('New Job')
@@ -309,7 +337,7 @@ class TimeKeeperFeature(Feature):
 	def handleAmendNote(self, line_no, action):
 		result = False
 
-		item = self.timekeeper.findItemWithColour(line_no)
+		item = self.getLineNode(line_no)
 
 		if item is not None:
 			if type(item) == beorn_lib.timekeeper.Job:
@@ -352,18 +380,46 @@ class TimeKeeperFeature(Feature):
 		elif int(event_id) == TimeKeeperFeature.USER_STOPPED_TYPING:
 			self.userStoppedTyping()
 
+	def updateCurrentJob(self):
+		if self.is_tracking:
+			project = self.timekeeper.addProject(self.getProjectName())
+			job = self.getJobName()
+
+			if project.hasJob(job):
+				self.current_job = project.getJob(job)
+			else:
+				self.current_job = project.addJob(job)
+
 	def polling_scm_function(self):
 		while not self.closedown.wait(self.poll_period):
-			if self.is_tracking:
-				project = self.timekeeper.addProject(self.getProjectName())
-				job = self.getJobName()
+			# the service tells us when the version changes.
+			if self.getServiceVersion() is None:
+				self.updateCurrentJob()
 
-				if project.hasJob(job):
-					self.current_job = project.getJob(job)
-				else:
-					self.current_job = project.addJob(job)
+	def onServiceMessage(self, message):
+		""" The service says if it found the repository, then only sends a
+			message when the version changes.
+		"""
+		for line in message.split('\n'):
+			try:
+				items = json.loads(line)
+			except ValueError:
+				continue
+
+			if items.get('found') is True:
+				self.service_root = items['root']
+
+			elif items.get('found') is False:
+				self.service_root = None
+
+			if 'version' in items:
+				self.current_version = items['version']
+				self.updateCurrentJob()
 
 	def close(self):
+		if self.use_service:
+			self.tab_window.stopService('timekeeper')
+
 		if self.timer_task is not None:
 			self.closedown.set()
 
@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#---------------------------------------------------------------------------------
+#     _____           _ _                ______                    _
+#    (_____)         | (_)              (____  \                  (_)
+#       _   ____   _ | |_  ____  ___     ____)  )_   _  ____  ____ _  ____
+#      | | |  _ \ / || | |/ _  |/ _ \   |  __  (| | | |/ _  |/ _  | |/ _  )
+#     _| |_| | | ( (_| | ( ( | | |_| |  | |__)  ) |_| ( ( | ( ( | | ( (/ /
+#    (_____)_| |_|\____|_|\_|| |\___/   |______/ \____|\_|| |\_|| |_|\____)
+#                        (_____|                      (_____(_____|
+#
+#    file: tree_monitor
+#    desc: Finds the directories of the source tree that have changed.
+#
+#          Only the directories that are open in the tree are checked, and a
+#          directory is only read when its mtime has changed. So a tree that
+#          is not changing costs a stat per open directory.
+#
+#  author: peter
+#    date: 18/10/2026
+#---------------------------------------------------------------------------------
+#                     Copyright (c) 2020 Peter Antoine
+#                           All rights Reserved.
+#                      Released Under the MIT Licence
+#---------------------------------------------------------------------------------
+
+import os
+
+
+class TreeMonitor(object):
+	def __init__(self, is_filtered):
+		""" is_filtered(name, is_dir) returns True for the entries that the
+			tree does not show.
+		"""
+		self.is_filtered = is_filtered
+		self.keys = {}
+
+	def readDirectory(self, path):
+		""" Returns the set of names in the directory that the tree shows """
+		result = set()
+
+		with os.scandir(path) as entries:
+			for entry in entries:
+				try:
+					is_dir = entry.is_dir()
+				except OSError:
+					is_dir = False
+
+				if not self.is_filtered(entry.name, is_dir):
+					result.add(entry.name)
+
+		return result
+
+	def check(self, listings):
+		""" listings is directory -> the names the tree has for it.
+
+			Returns a list of (directory, added names, removed names) for the
+			directories that have changed since they were last checked.
+		"""
+		result = []
+
+		for path in listings:
+			try:
+				stat = os.stat(path)
+				key = (stat.st_mtime_ns, stat.st_ino)
+			except OSError:
+				key = None
+
+			if key is not None and self.keys.get(path) != key:
+				try:
+					names = self.readDirectory(path)
+				except OSError:
+					continue
+
+				self.keys[path] = key
+
+				added = names - listings[path]
+				removed = listings[path] - names
+
+				if len(added) > 0 or len(removed) > 0:
+					result.append((path, added, removed))
+
+			elif key is None:
+				# the directory has gone, the parent will remove it.
+				self.keys.pop(path, None)
+
+		return result
+
+	def reset(self):
+		""" Read every directory on the next check """
+		self.keys = {}
+
+# vim: ts=4 sw=4 noexpandtab nocin ai
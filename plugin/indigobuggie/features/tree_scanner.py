@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#---------------------------------------------------------------------------------
+#     _____           _ _                ______                    _
+#    (_____)         | (_)              (____  \                  (_)
+#       _   ____   _ | |_  ____  ___     ____)  )_   _  ____  ____ _  ____
+#      | | |  _ \ / || | |/ _  |/ _ \   |  __  (| | | |/ _  |/ _  | |/ _  )
+#     _| |_| | | ( (_| | ( ( | | |_| |  | |__)  ) |_| ( ( | ( ( | | ( (/ /
+#    (_____)_| |_|\____|_|\_|| |\___/   |______/ \____|\_|| |\_|| |_|\____)
+#                        (_____|                      (_____(_____|
+#
+#    file: tree_scanner
+#    desc: Reads a whole directory tree on a pool of threads.
+#
+#          Each directory is read with os.scandir on a worker and the
+#          directories found are handed back to the pool, so on a slow
+#          (network) file system many directories are waited on at once.
+#          The ignored directories are never read.
+#
+#  author: peter
+#    date: 18/10/2026
+#---------------------------------------------------------------------------------
+#                     Copyright (c) 2020 Peter Antoine
+#                           All rights Reserved.
+#                      Released Under the MIT Licence
+#---------------------------------------------------------------------------------
+
+import os
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+SCAN_WORKERS = 8
+
+
+class TreeScanner(object):
+	def __init__(self, is_filtered, max_workers=SCAN_WORKERS):
+		""" is_filtered(name, is_dir) returns True for the entries that the
+			tree does not show.
+		"""
+		self.is_filtered = is_filtered
+		self.max_workers = max_workers
+
+	def readDirectory(self, path):
+		""" Returns (path, names, directories to read) """
+		names = set()
+		directories = []
+
+		try:
+			with os.scandir(path) as entries:
+				for entry in entries:
+					try:
+						is_dir = entry.is_dir()
+						is_link = entry.is_symlink()
+					except OSError:
+						(is_dir, is_link) = (False, False)
+
+					if not self.is_filtered(entry.name, is_dir):
+						names.add(entry.name)
+
+						# links are shown, but not followed so there are no loops.
+						if is_dir and not is_link:
+							directories.append(entry.path)
+
+		except OSError:
+			pass
+
+		return (path, names, directories)
+
+	def scan(self, root):
+		""" Returns a list of (directory, names) for root and every directory
+			below it, the parents are before their children.
+		"""
+		result = []
+
+		with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+			pending = set([pool.submit(self.readDirectory, root)])
+
+			while len(pending) > 0:
+				(done, pending) = wait(pending, return_when=FIRST_COMPLETED)
+
+				for job in done:
+					(path, names, directories) = job.result()
+					result.append((path, names))
+
+					for directory in directories:
+						pending.add(pool.submit(self.readDirectory, directory))
+
+		result.sort(key=lambda item: item[0].count(os.sep))
+
+		return result
+
+# vim: ts=4 sw=4 noexpandtab nocin ai
@@ -0,0 +1,343 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#---------------------------------------------------------------------------------
+#	  _____			  _ _				 ______					   _
+#	 (_____)		 | (_)				(____  \				  (_)
+#		_	____   _ | |_  ____  ___	 ____)	)_	 _	____  ____ _  ____
+#	   | | |  _ \ / || | |/ _  |/ _ \	|  __  (| | | |/ _	|/ _  | |/ _  )
+#	  _| |_| | | ( (_| | ( ( | | |_| |	| |__)	) |_| ( ( | ( ( | | ( (/ /
+#	 (_____)_| |_|\____|_|\_|| |\___/	|______/ \____|\_|| |\_|| |_|\____)
+#						 (_____|					  (_____(_____|
+#
+#	 file: file_watcher
+#	 desc: inotify based file watcher for the scm server.
+#
+#	 This uses a pure ctypes binding to the libc inotify functions so that
+#	 nothing outside of the standard library is needed. If inotify is not
+#	 available (not linux, or the watch limit is hit) then create_watcher()
+#	 returns None and the server should fall back to polling. The watch limit
+#	 can also be hit later, when new directories are made, then wait() raises
+#	 OSError and the server should fall back to polling then.
+#
+#  author: peter
+#	 date: 18/10/2026
+#---------------------------------------------------------------------------------
+#					  Copyright (c) 2020 Peter Antoine
+#							All rights Reserved.
+#					   Released Under the MIT Licence
+#---------------------------------------------------------------------------------
+
+import os
+import time
+import errno
+import select
+import struct
+import ctypes
+import ctypes.util
+
+# inotify flags (from linux/inotify.h)
+IN_CLOSE_WRITE	= 0x00000008
+IN_MOVED_FROM	= 0x00000040
+IN_MOVED_TO		= 0x00000080
+IN_CREATE		= 0x00000100
+IN_DELETE		= 0x00000200
+IN_DELETE_SELF	= 0x00000400
+IN_MOVE_SELF	= 0x00000800
+IN_Q_OVERFLOW	= 0x00004000
+IN_IGNORED		= 0x00008000
+IN_ONLYDIR		= 0x01000000
+IN_EXCL_UNLINK	= 0x04000000
+IN_ISDIR		= 0x40000000
+
+IN_NONBLOCK		= 0o00004000
+IN_CLOEXEC		= 0o02000000
+
+TREE_MASK		= (IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE |
+				   IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR | IN_EXCL_UNLINK)
+META_MASK		= IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_ONLYDIR
+
+EVENT_HEADER	= struct.Struct('iIII')
+
+# what the watch is looking at
+WATCH_TREE		= 0
+WATCH_REPO		= 1
+WATCH_REFS		= 2
+
+# The files within the repository directory that change the status of the tree.
+META_FILES		= ('index', 'HEAD', 'packed-refs', 'MERGE_HEAD')
+
+# Editor droppings, these never change the status of the tree (and vim writes them a lot).
+IGNORED_SUFFIXES = ('.swp', '.swo', '.swn', '.swx', '~')
+IGNORED_NAMES	 = ('4913', '.git')
+
+
+def find_repository_dir(root):
+	""" Find the directory that holds the git metadata for the given root.
+		Submodules have a '.git' file that points to the real directory.
+	"""
+	result = None
+	git_path = os.path.join(root, '.git')
+
+	if os.path.isdir(git_path):
+		result = git_path
+
+	elif os.path.isfile(git_path):
+		try:
+			with open(git_path, 'r') as f:
+				line = f.readline().strip()
+
+			if line.startswith('gitdir:'):
+				result = os.path.normpath(os.path.join(root, line[7:].strip()))
+
+		except (IOError, OSError):
+			pass
+
+	return result
+
+
+class InotifyWatcher(object):
+	def __init__(self, libc, fd, settle_time, is_filtered=None):
+		""" is_filtered(name) returns True for the directories that are not
+			watched, as nothing looks at the files below them.
+		"""
+		self.libc = libc
+		self.fd = fd
+		self.settle_time = settle_time
+		self.is_filtered = is_filtered or (lambda name: False)
+		self.watches = {}
+		self.roots = []
+		self.excluded = set()
+		self.journals = {}
+		self.overflowed = False
+
+	def _addWatch(self, path, mask, root, kind):
+		wd = self.libc.inotify_add_watch(self.fd, os.fsencode(path), mask)
+
+		if wd < 0:
+			err = ctypes.get_errno()
+
+			if err == errno.ENOSPC or err == errno.ENOMEM:
+				# Out of watches - the caller needs to give up on watching.
+				raise OSError(err, os.strerror(err), path)
+
+			# directory may have gone away while walking, that is fine.
+			return False
+
+		self.watches[wd] = (path, root, kind)
+		return True
+
+	def _addTree(self, path, root, journal=None):
+		""" Add a watch on path and all the directories below it.
+			Sub-repositories have their own watches, so they are not walked.
+			The files found are added to the journal, as they may have been
+			written before the watch was added.
+		"""
+		for dir_path, dirs, files in os.walk(path):
+			if dir_path != root and (dir_path in self.roots or dir_path in self.excluded):
+				del dirs[:]
+				continue
+
+			self._addWatch(dir_path, TREE_MASK, root, WATCH_TREE)
+			dirs[:] = [d for d in dirs if d not in IGNORED_NAMES and not self.is_filtered(d)]
+
+			if journal is not None:
+				for name in files:
+					journal.add(os.path.relpath(os.path.join(dir_path, name), root))
+
+	def addRepository(self, root):
+		""" Start watching the working tree of the repository at root """
+		root = os.path.abspath(root)
+
+		if root not in self.roots:
+			self.roots.append(root)
+
+			# longest first, so the owner of a path is the first prefix match.
+			self.roots.sort(key=len, reverse=True)
+
+			self._addTree(root, root)
+
+			repo_dir = find_repository_dir(root)
+
+			if repo_dir is not None:
+				self._addWatch(repo_dir, META_MASK, root, WATCH_REPO)
+
+				heads = os.path.join(repo_dir, 'refs', 'heads')
+				if os.path.isdir(heads):
+					for dir_path, dirs, files in os.walk(heads):
+						self._addWatch(dir_path, META_MASK, root, WATCH_REFS)
+
+	def refresh(self):
+		""" Add the watches for the directories that are no longer filtered.
+			The changes made in them while they were not watched are not
+			known, so git has to check everything.
+		"""
+		for root in self.roots:
+			self._addTree(root, root)
+
+		for root in self.journals:
+			self.journals[root].invalidate()
+
+	def setJournal(self, root, journal):
+		""" All the paths that change in the working tree of the repository
+			are added to the journal (see fsmonitor).
+		"""
+		self.journals[os.path.abspath(root)] = journal
+
+	def findOwner(self, path):
+		for root in self.roots:
+			if path == root or path.startswith(root + os.sep):
+				return root
+
+		return None
+
+	def _readEvents(self, touched):
+		try:
+			data = os.read(self.fd, 64 * 1024)
+		except OSError as e:
+			if e.errno in (errno.EAGAIN, errno.EINTR):
+				return
+			raise
+
+		offset = 0
+		while offset + EVENT_HEADER.size <= len(data):
+			(wd, mask, cookie, length) = EVENT_HEADER.unpack_from(data, offset)
+			name = data[offset + EVENT_HEADER.size:offset + EVENT_HEADER.size + length].rstrip(b'\0')
+			offset += EVENT_HEADER.size + length
+
+			if mask & IN_Q_OVERFLOW:
+				# lost events, everything needs checking.
+				self.overflowed = True
+
+				for root in self.journals:
+					self.journals[root].invalidate()
+				continue
+
+			if wd not in self.watches:
+				continue
+
+			(dir_path, root, kind) = self.watches[wd]
+
+			if mask & IN_IGNORED:
+				del self.watches[wd]
+				continue
+
+			name = os.fsdecode(name)
+
+			if kind == WATCH_REPO:
+				if name in META_FILES:
+					touched.setdefault(root, set())
+				continue
+
+			elif kind == WATCH_REFS:
+				if mask & IN_ISDIR and mask & IN_CREATE:
+					self._addWatch(os.path.join(dir_path, name), META_MASK, root, WATCH_REFS)
+				touched.setdefault(root, set())
+				continue
+
+			path = os.path.join(dir_path, name)
+			owner = self.findOwner(path)
+
+			# git has to be told about everything, even the files ignored here.
+			if owner in self.journals and path != owner:
+				self.journals[owner].add(os.path.relpath(path, owner))
+
+			if name in IGNORED_NAMES or name.endswith(IGNORED_SUFFIXES):
+				continue
+
+			if mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO) and not self.is_filtered(name):
+				self._addTree(path, root, self.journals.get(root))
+
+			if owner is not None:
+				touched.setdefault(owner, set()).add(os.path.relpath(dir_path, owner))
+
+	def wait(self, timeout):
+		""" Wait for up to timeout seconds for a change in any watched tree.
+
+			Returns a dictionary of repository root -> sorted list of the
+			directories (relative to the root) that have had entries change.
+			An empty list means only the repository metadata changed (commit,
+			stage, checkout) and None means that events were lost and the
+			whole tree needs checking. Events are collected for
+			settle_time after the first one, so a burst of writes (a build or
+			a checkout) only produces one result.
+
+			Raises OSError if the watches for new directories cannot be added,
+			the watcher cannot be used after that.
+		"""
+		touched = {}
+
+		if timeout < 0:
+			timeout = 0
+
+		(ready, _, _) = select.select([self.fd], [], [], timeout)
+
+		if ready:
+			self._readEvents(touched)
+
+			end_time = time.time() + self.settle_time
+			remaining = self.settle_time
+
+			while remaining > 0:
+				(ready, _, _) = select.select([self.fd], [], [], remaining)
+
+				if ready:
+					self._readEvents(touched)
+
+				remaining = end_time - time.time()
+
+		result = {}
+		for root in touched:
+			result[root] = sorted(touched[root])
+
+		if self.overflowed:
+			self.overflowed = False
+			for root in self.roots:
+				result[root] = None
+
+		return result
+
+	def close(self):
+		if self.fd is not None:
+			os.close(self.fd)
+			self.fd = None
+
+
+def create_watcher(roots, settle_time=0.25, exclude=None, is_filtered=None):
+	""" Create a watcher for the given repository roots. The repositories in
+		exclude are watched by someone else, so they are not walked, and nor
+		are the directories that is_filtered(name) returns True for.
+
+		Returns None if inotify is not available, the caller should then use
+		polling instead.
+	"""
+	result = None
+
+	try:
+		libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+		init = libc.inotify_init1
+	except (OSError, AttributeError):
+		return None
+
+	libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+	libc.inotify_add_watch.restype = ctypes.c_int
+
+	fd = init(IN_NONBLOCK | IN_CLOEXEC)
+
+	if fd >= 0:
+		result = InotifyWatcher(libc, fd, settle_time, is_filtered)
+
+		if exclude is not None:
+			result.excluded = set(os.path.abspath(item) for item in exclude)
+
+		try:
+			# nested repositories first, so the parents walk does not descend into them.
+			for root in sorted(roots, key=len, reverse=True):
+				result.addRepository(root)
+
+		except OSError:
+			result.close()
+			result = None
+
+	return result
+
+# vim: ts=4 sw=4 noexpandtab nocin ai
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#---------------------------------------------------------------------------------
+#	  _____			  _ _				 ______					   _
+#	 (_____)		 | (_)				(____  \				  (_)
+#		_	____   _ | |_  ____  ___	 ____)	)_	 _	____  ____ _  ____
+#	   | | |  _ \ / || | |/ _  |/ _ \	|  __  (| | | |/ _	|/ _  | |/ _  )
+#	  _| |_| | | ( (_| | ( ( | | |_| |	| |__)	) |_| ( ( | ( ( | | ( (/ /
+#	 (_____)_| |_|\____|_|\_|| |\___/	|______/ \____|\_|| |\_|| |_|\____)
+#						 (_____|					  (_____(_____|
+#
+#	 file: fingerprint
+#	 desc: Cheap stat fingerprint of a repository.
+#
+#	 Takes the mtime and size of the repository metadata (index, HEAD, refs)
+#	 and the mtimes of the working tree directories. If none of these have
+#	 moved then the status of the repository is taken as not changed and the
+#	 expensive status call can be skipped. The filtered directories are not
+#	 walked, as their changes are never sent.
+#
+#	 The files are only stat'ed in the directories the file watcher reports,
+#	 the poll of the whole tree would cost as much as the status itself. So
+#	 a poll sees files that are added, removed or saved by rename (as vim
+#	 does) but not a file rewritten in place.
+#
+#  author: peter
+#	 date: 18/10/2026
+#---------------------------------------------------------------------------------
+#					  Copyright (c) 2020 Peter Antoine
+#							All rights Reserved.
+#					   Released Under the MIT Licence
+#---------------------------------------------------------------------------------
+
+import os
+from file_watcher import find_repository_dir, META_FILES
+
+
+def stat_key(path):
+	try:
+		st = os.stat(path)
+		return (st.st_mtime_ns, st.st_size)
+	except OSError:
+		return None
+
+
+def directory_key(path):
+	""" Returns a key made from the entries of the directory, or None if the
+		directory does not exist.
+	"""
+	entries = []
+
+	try:
+		with os.scandir(path) as it:
+			for entry in it:
+				if entry.name == '.git':
+					continue
+
+				try:
+					if entry.is_dir(follow_symlinks=False):
+						# the contents of the directory have their own key.
+						entries.append((entry.name, 0, 0))
+					else:
+						st = entry.stat(follow_symlinks=False)
+						entries.append((entry.name, st.st_mtime_ns, st.st_size))
+				except OSError:
+					pass
+	except OSError:
+		return None
+
+	entries.sort()
+	return hash(tuple(entries))
+
+
+def directory_stat_key(path):
+	try:
+		st = os.stat(path)
+		return (st.st_mtime_ns, st.st_ino)
+	except OSError:
+		return None
+
+
+def read_head(repo_dir):
+	""" Returns the branch and commit that HEAD points at, or None if they
+		cannot be read.
+	"""
+	try:
+		with open(os.path.join(repo_dir, 'HEAD'), 'r') as f:
+			head = f.read().strip()
+
+		if not head.startswith('ref:'):
+			# detached - HEAD is the commit.
+			return (None, head)
+
+		ref = head[4:].strip()
+		ref_file = os.path.join(repo_dir, ref)
+
+		if os.path.isfile(ref_file):
+			with open(ref_file, 'r') as f:
+				return (ref, f.read().strip())
+
+		with open(os.path.join(repo_dir, 'packed-refs'), 'r') as f:
+			for line in f:
+				parts = line.split()
+
+				if len(parts) == 2 and parts[1] == ref:
+					return (ref, parts[0])
+
+		# new branch with no commits.
+		return (ref, None)
+
+	except (IOError, OSError):
+		return None
+
+
+class Fingerprint(object):
+	def __init__(self, root, exclude=None, is_filtered=None):
+		""" is_filtered(name) returns True for the directories that are not
+			walked.
+		"""
+		self.root = os.path.abspath(root)
+		self.is_filtered = is_filtered or (lambda name: False)
+		self.repo_dir = find_repository_dir(self.root)
+		self.metadata = None
+		self.directories = {}
+
+		# nested repositories have their own fingerprints.
+		self.exclude = set()
+		if exclude is not None:
+			for item in exclude:
+				item = os.path.abspath(item)
+				if item != self.root:
+					self.exclude.add(item)
+
+	def head(self):
+		if self.repo_dir is None:
+			return None
+
+		return read_head(self.repo_dir)
+
+	def _metadataKey(self):
+		result = []
+
+		if self.repo_dir is not None:
+			for name in META_FILES:
+				result.append(stat_key(os.path.join(self.repo_dir, name)))
+
+			for dir_path, dirs, files in os.walk(os.path.join(self.repo_dir, 'refs')):
+				for name in files:
+					result.append((name, stat_key(os.path.join(dir_path, name))))
+
+		return result
+
+	def _walkTree(self):
+		result = {}
+
+		for dir_path, dirs, files in os.walk(self.root):
+			result[os.path.relpath(dir_path, self.root)] = directory_stat_key(dir_path)
+			dirs[:] = [d for d in dirs if d != '.git' and not self.is_filtered(d) and os.path.join(dir_path, d) not in self.exclude]
+
+		return result
+
+	def update(self, touched=None):
+		""" Update the fingerprint and return True if it has changed.
+
+			If touched is None the directories of the whole working tree are
+			checked, else only the files in the listed directories (relative
+			to the root) are checked. An empty list will only check the
+			repository metadata.
+		"""
+		changed = False
+
+		metadata = self._metadataKey()
+		if metadata != self.metadata:
+			self.metadata = metadata
+			changed = True
+
+		if touched is None:
+			directories = self._walkTree()
+
+			if directories != self.directories:
+				self.directories = directories
+				changed = True
+		else:
+			for rel_path in touched:
+				key = directory_key(os.path.join(self.root, rel_path))
+
+				if key is None:
+					if rel_path in self.directories:
+						del self.directories[rel_path]
+					changed = True
+
+				elif self.directories.get(rel_path) != key:
+					self.directories[rel_path] = key
+					changed = True
+
+		return changed
+
+# vim: ts=4 sw=4 noexpandtab nocin ai
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#---------------------------------------------------------------------------------
+#	  _____			  _ _				 ______					   _
+#	 (_____)		 | (_)				(____  \				  (_)
+#		_	____   _ | |_  ____  ___	 ____)	)_	 _	____  ____ _  ____
+#	   | | |  _ \ / || | |/ _  |/ _ \	|  __  (| | | |/ _	|/ _  | |/ _  )
+#	  _| |_| | | ( (_| | ( ( | | |_| |	| |__)	) |_| ( ( | ( ( | | ( (/ /
+#	 (_____)_| |_|\____|_|\_|| |\___/	|______/ \____|\_|| |\_|| |_|\____)
+#						 (_____|					  (_____(_____|
+#
+#	 file: fsmonitor
+#	 desc: git core.fsmonitor hook fed by the scm server file watcher.
+#
+#	 The server writes every path the watcher sees change to a journal file
+#	 for the repository. The git commands run by the server are given this
+#	 file as their core.fsmonitor hook (version 2), the token is the session
+#	 of the journal and the offset that had been read. So git only has to
+#	 check the files that have changed since its last status.
+#
+#	 Anything that is not understood (old session, lost events) answers '/',
+#	 which tells git to check everything.
+#
+#  author: peter
+#	 date: 18/10/2026
+#---------------------------------------------------------------------------------
+#					  Copyright (c) 2020 Peter Antoine
+#							All rights Reserved.
+#					   Released Under the MIT Licence
+#---------------------------------------------------------------------------------
+
+import os
+import sys
+import shlex
+import hashlib
+import binascii
+from threading import Lock
+
+# The environment variable that has the journal directory for the hook.
+JOURNAL_DIR_ENV = 'IB_FSMONITOR_DIR'
+
+# When the journal is bigger than this a new session is started.
+MAX_JOURNAL_SIZE = 4 * 1024 * 1024
+
+TOKEN_PREFIX = 'indigobuggie'
+
+
+def journal_name(journal_dir, root):
+	# git runs the hook in the real path of the work tree.
+	root = os.path.realpath(root)
+	digest = hashlib.md5(root.encode('utf-8')).hexdigest()[:12]
+	return os.path.join(journal_dir, os.path.basename(root) + '-' + digest + '.journal')
+
+
+class Journal(object):
+	def __init__(self, journal_dir, root):
+		self.file_name = journal_name(journal_dir, root)
+		self.lock = Lock()
+		self.journal = None
+		self._newSession()
+
+	def _newSession(self):
+		session = binascii.hexlify(os.urandom(8)).decode('ascii')
+		temp_file = self.file_name + '.tmp'
+
+		if self.journal is not None:
+			self.journal.close()
+
+		# replace the file whole, so the hook never sees half a header.
+		with open(temp_file, 'wb') as f:
+			f.write(session.encode('ascii') + b'\n')
+
+		os.replace(temp_file, self.file_name)
+		self.journal = open(self.file_name, 'ab')
+
+	def _write(self, line):
+		with self.lock:
+			if self.journal is not None:
+				if self.journal.tell() > MAX_JOURNAL_SIZE:
+					self._newSession()
+
+				self.journal.write(line)
+				self.journal.flush()
+
+	def add(self, path):
+		""" Add a path (relative to the root) that has changed """
+		if '\n' in path or '\0' in path:
+			self.invalidate()
+		else:
+			self._write(os.fsencode(path) + b'\n')
+
+	def invalidate(self):
+		""" Events were lost, git needs to check everything """
+		self._write(b'/\n')
+
+	def close(self):
+		with self.lock:
+			if self.journal is not None:
+				self.journal.close()
+				self.journal = None
+
+			try:
+				os.unlink(self.file_name)
+			except OSError:
+				pass
+
+
+def hook_command():
+	""" The core.fsmonitor command for this file """
+	# -S: no site packages, the hook is run for every git status so start fast.
+	return shlex.quote(sys.executable) + ' -S ' + shlex.quote(os.path.abspath(__file__))
+
+
+def enable_hook(journal_dir):
+	""" Set the environment so the git commands started by this process use
+		the hook. The config is added to any the caller already has.
+	"""
+	os.environ[JOURNAL_DIR_ENV] = journal_dir
+
+	count = int(os.environ.get('GIT_CONFIG_COUNT', '0'))
+
+	for (key, value) in (('core.fsmonitor', hook_command()), ('core.fsmonitorHookVersion', '2')):
+		os.environ['GIT_CONFIG_KEY_' + str(count)] = key
+		os.environ['GIT_CONFIG_VALUE_' + str(count)] = value
+		count += 1
+
+	os.environ['GIT_CONFIG_COUNT'] = str(count)
+
+
+def disable_hook():
+	""" Stop the git commands started from now on using the hook, the later
+		config item replaces the one added by enable_hook.
+	"""
+	os.environ.pop(JOURNAL_DIR_ENV, None)
+
+	count = int(os.environ.get('GIT_CONFIG_COUNT', '0'))
+
+	os.environ['GIT_CONFIG_KEY_' + str(count)] = 'core.fsmonitor'
+	os.environ['GIT_CONFIG_VALUE_' + str(count)] = 'false'
+	os.environ['GIT_CONFIG_COUNT'] = str(count + 1)
+
+
+def query(journal_dir, root, token):
+	""" Returns (new token, list of changed paths) or (new token, None) if
+		everything needs checking.
+	"""
+	try:
+		with open(journal_name(journal_dir, root), 'rb') as f:
+			contents = f.read()
+
+	except (IOError, OSError):
+		return (TOKEN_PREFIX + ':none:0', None)
+
+	(session, _, _) = contents.partition(b'\n')
+	session = session.decode('ascii', 'replace')
+
+	# only the whole lines, the server may be writing the last one.
+	end = contents.rfind(b'\n') + 1
+	new_token = TOKEN_PREFIX + ':' + session + ':' + str(end)
+
+	parts = token.split(':')
+
+	if len(parts) != 3 or parts[0] != TOKEN_PREFIX or parts[1] != session or not parts[2].isdigit():
+		return (new_token, None)
+
+	start = int(parts[2])
+
+	if start > end:
+		return (new_token, None)
+
+	paths = set()
+
+	for line in contents[start:end].split(b'\n'):
+		if line == b'/':
+			return (new_token, None)
+
+		elif line != b'':
+			paths.add(line)
+
+	return (new_token, sorted(paths))
+
+
+def main():
+	""" git runs the hook in the work tree as: hook <version> <token> """
+	if len(sys.argv) < 3 or sys.argv[1] != '2' or JOURNAL_DIR_ENV not in os.environ:
+		return 1
+
+	(new_token, paths) = query(os.environ[JOURNAL_DIR_ENV], os.getcwd(), sys.argv[2])
+
+	output = new_token.encode('utf-8') + b'\0'
+
+	if paths is None:
+		output += b'/\0'
+	else:
+		for path in paths:
+			output += path + b'\0'
+
+	sys.stdout.buffer.write(output)
+	sys.stdout.flush()
+
+	return 0
+
+
+if __name__ == "__main__":
+	sys.exit(main())
+
+# vim: ts=4 sw=4 noexpandtab nocin ai
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#---------------------------------------------------------------------------------
+#	  _____			  _ _				 ______					   _
+#	 (_____)		 | (_)				(____  \				  (_)
+#		_	____   _ | |_  ____  ___	 ____)	)_	 _	____  ____ _  ____
+#	   | | |  _ \ / || | |/ _  |/ _ \	|  __  (| | | |/ _	|/ _  | |/ _  )
+#	  _| |_| | | ( (_| | ( ( | | |_| |	| |__)	) |_| ( ( | ( ( | | ( (/ /
+#	 (_____)_| |_|\____|_|\_|| |\___/	|______/ \____|\_|| |\_|| |_|\____)
+#						 (_____|					  (_____(_____|
+#
+#	 file: git_batch
+#	 desc: Long lived 'git cat-file --batch' processes.
+#
+#	 Reading an object is a write of its name and a read of the answer on
+#	 the pipes of a process that is already running, instead of starting a
+#	 new git for every file. Each process does one read at a time, the pool
+#	 starts another if they are all busy.
+#
+#  author: peter
+#	 date: 18/10/2026
+#---------------------------------------------------------------------------------
+#					  Copyright (c) 2020 Peter Antoine
+#							All rights Reserved.
+#					   Released Under the MIT Licence
+#---------------------------------------------------------------------------------
+
+import os
+import subprocess
+from threading import Lock
+
+
+class CatFileProcess(object):
+	def __init__(self, root):
+		self.process = subprocess.Popen(['git', 'cat-file', '--batch'],
+										cwd=root,
+										stdin=subprocess.PIPE,
+										stdout=subprocess.PIPE,
+										stderr=subprocess.DEVNULL)
+
+	def read(self, object_name):
+		""" Returns (type, contents) of the object, or None if git does not
+			have the object.
+		"""
+		self.process.stdin.write(object_name.encode('utf-8') + b'\n')
+		self.process.stdin.flush()
+
+		header = self.process.stdout.readline()
+
+		if header == b'':
+			raise IOError("git cat-file has exited")
+
+		# "<sha> <type> <size>" or "<name> missing"
+		parts = header.split()
+
+		if len(parts) != 3:
+			return None
+
+		size = int(parts[2])
+		contents = self.process.stdout.read(size)
+
+		# the contents are followed by a new line.
+		self.process.stdout.read(1)
+
+		if len(contents) != size:
+			raise IOError("git cat-file has exited")
+
+		return (parts[1].decode('ascii'), contents)
+
+	def close(self):
+		try:
+			self.process.stdin.close()
+			self.process.wait(timeout=1)
+
+		except (IOError, OSError, subprocess.TimeoutExpired):
+			self.process.kill()
+
+
+class CatFilePool(object):
+	def __init__(self, root):
+		self.root = root
+		self.idle = []
+		self.lock = Lock()
+
+	def read(self, object_name):
+		""" Read the object on an idle process. Returns the same as
+			CatFileProcess.read().
+		"""
+		if '\n' in object_name:
+			return None
+
+		with self.lock:
+			if len(self.idle) > 0:
+				process = self.idle.pop()
+			else:
+				process = CatFileProcess(self.root)
+
+		try:
+			result = process.read(object_name)
+
+		except (IOError, OSError, ValueError):
+			# the process is in an unknown state, don't use it again.
+			process.close()
+			raise
+
+		with self.lock:
+			self.idle.append(process)
+
+		return result
+
+	def getFile(self, path, version):
+		""" Returns the lines of the file at the version, or None if git does
+			not have the file.
+		"""
+		if os.path.isabs(path):
+			path = os.path.relpath(path, self.root)
+
+		result = self.read(version + ':' + path.replace(os.sep, '/'))
+
+		if result is None or result[0] != 'blob':
+			return None
+
+		lines = result[1].decode('utf-8', 'replace').split('\n')
+
+		if lines[-1] == '':
+			del lines[-1]
+
+		return lines
+
+	def close(self):
+		with self.lock:
+			for process in self.idle:
+				process.close()
+
+			self.idle = []
+
+# vim: ts=4 sw=4 noexpandtab nocin ai
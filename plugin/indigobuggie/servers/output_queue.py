@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#---------------------------------------------------------------------------------
+#	  _____			  _ _				 ______					   _
+#	 (_____)		 | (_)				(____  \				  (_)
+#		_	____   _ | |_  ____  ___	 ____)	)_	 _	____  ____ _  ____
+#	   | | |  _ \ / || | |/ _  |/ _ \	|  __  (| | | |/ _	|/ _  | |/ _  )
+#	  _| |_| | | ( (_| | ( ( | | |_| |	| |__)	) |_| ( ( | ( ( | | ( (/ /
+#	 (_____)_| |_|\____|_|\_|| |\___/	|______/ \____|\_|| |\_|| |_|\____)
+#						 (_____|					  (_____(_____|
+#
+#	 file: output_queue
+#	 desc: The messages waiting to be written to vim.
+#
+#	 The messages are written by their own thread, so the scans never wait
+#	 on vim reading the channel. The queue is bounded. When it is full the
+#	 changes for a repository are not queued, the queued changes for it are
+#	 dropped and the repository is marked as needing a resync. When there is
+#	 room again the whole state of the repository is sent in one message.
+#
+#  author: peter
+#	 date: 18/10/2026
+#---------------------------------------------------------------------------------
+#					  Copyright (c) 2020 Peter Antoine
+#							All rights Reserved.
+#					   Released Under the MIT Licence
+#---------------------------------------------------------------------------------
+
+from threading import Thread, Condition
+
+# How long close waits for the queue to be written.
+CLOSE_TIMEOUT = 5
+
+
+def is_state_message(message):
+	""" Changes and stats are replaced by a resync, everything else (replies
+		and the scm list) has to be sent.
+	"""
+	return 'root' in message and ('changes' in message or 'stats' in message)
+
+
+class OutputQueue(object):
+	def __init__(self, write_function, resync_function, max_size):
+		""" write_function(messages) writes a list of messages.
+			resync_function(root) returns the message with the whole state of
+			the repository, or None.
+		"""
+		self.write_function = write_function
+		self.resync_function = resync_function
+		self.max_size = max_size
+		self.messages = []
+		self.resyncs = []
+		self.directories = {}
+		self.closed = False
+		self.broken = False
+		self.condition = Condition()
+		self.thread = Thread(target=self._writer, daemon=True)
+		self.thread.start()
+
+	def _collapse(self, root):
+		""" Drop the queued state messages for root. The directories they
+			define are kept, as the client has been told the later messages
+			can use them.
+		"""
+		directories = self.directories.setdefault(root, {})
+		kept = []
+
+		for message in self.messages:
+			if message.get('root') == root and is_state_message(message):
+				directories.update(message.get('dirs', {}))
+			else:
+				kept.append(message)
+
+		self.messages = kept
+
+		if root not in self.resyncs:
+			self.resyncs.append(root)
+
+	def _add(self, message):
+		root = message.get('root')
+
+		if is_state_message(message) and (root in self.resyncs or len(self.messages) >= self.max_size):
+			self._collapse(root)
+			self.directories[root].update(message.get('dirs', {}))
+		else:
+			self.messages.append(message)
+
+	def put(self, message):
+		self.putAll([message])
+
+	def putAll(self, messages):
+		""" The messages are written together if the writer is waiting """
+		with self.condition:
+			if not self.closed:
+				for message in messages:
+					self._add(message)
+
+				self.condition.notify()
+
+	def _resyncMessages(self, roots, directories):
+		result = []
+
+		for root in roots:
+			message = self.resync_function(root)
+
+			if message is not None:
+				dropped = directories.get(root, {})
+
+				if len(dropped) > 0 and message.get('encoding') == 'compact':
+					message['dirs'].update(dropped)
+
+				elif len(dropped) > 0:
+					# the client only reads the directories from compact messages.
+					result.append({	'type': message['type'], 'root': root, 'ident': message['ident'],
+									'encoding': 'compact', 'changes': '', 'unchanged': '',
+									'dirs': dropped})
+
+				result.append(message)
+
+		return result
+
+	def _writer(self):
+		while True:
+			with self.condition:
+				while not self.closed and len(self.messages) == 0 and len(self.resyncs) == 0:
+					self.condition.wait()
+
+				if len(self.messages) == 0 and len(self.resyncs) == 0:
+					break
+
+				(messages, self.messages) = (self.messages, [])
+				(roots, self.resyncs) = (self.resyncs, [])
+				(directories, self.directories) = (self.directories, {})
+
+			# built now, so it has everything up to the time it is sent.
+			messages += self._resyncMessages(roots, directories)
+
+			if not self.broken and len(messages) > 0:
+				try:
+					self.write_function(messages)
+				except (IOError, OSError, ValueError):
+					# vim has gone, nothing else can be sent.
+					self.broken = True
+
+	def close(self):
+		""" Write what is queued and stop the writer """
+		with self.condition:
+			self.closed = True
+			self.condition.notify()
+
+		self.thread.join(CLOSE_TIMEOUT)
+
+# vim: ts=4 sw=4 noexpandtab nocin ai
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#---------------------------------------------------------------------------------
+#	  _____			  _ _				 ______					   _
+#	 (_____)		 | (_)				(____  \				  (_)
+#		_	____   _ | |_  ____  ___	 ____)	)_	 _	____  ____ _  ____
+#	   | | |  _ \ / || | |/ _  |/ _ \	|  __  (| | | |/ _	|/ _  | |/ _  )
+#	  _| |_| | | ( (_| | ( ( | | |_| |	| |__)	) |_| ( ( | ( ( | | ( (/ /
+#	 (_____)_| |_|\____|_|\_|| |\___/	|______/ \____|\_|| |\_|| |_|\____)
+#						 (_____|					  (_____(_____|
+#
+#	 file: path_filter
+#	 desc: The Source Tree ignore rules, applied in the scm server.
+#
+#	 The changes for the ignored files are removed before they are sent, so
+#	 build trees and the like do not have to cross the channel just for the
+#	 Source Tree to throw them away.
+#
+#  author: peter
+#	 date: 18/10/2026
+#---------------------------------------------------------------------------------
+#					  Copyright (c) 2020 Peter Antoine
+#							All rights Reserved.
+#					   Released Under the MIT Licence
+#---------------------------------------------------------------------------------
+
+
+class PathFilter(object):
+	def __init__(self, ignore_suffixes=None, ignore_directories=None, hide_dot_files=False):
+		self.suffixes = tuple('.' + item.lstrip('.') for item in (ignore_suffixes or []) if item.strip('.') != '')
+		self.directories = frozenset(item for item in (ignore_directories or []) if item != '')
+		self.hide_dot_files = hide_dot_files in (True, 'True')
+
+	@classmethod
+	def fromParameters(cls, parameters):
+		""" parameters is the 'filters' item from the client """
+		if parameters is None:
+			return None
+
+		return cls(	parameters.get('ignore_suffixes'),
+					parameters.get('ignore_directories'),
+					parameters.get('hide_dot_files'))
+
+	def isFilteredDirectory(self, name):
+		""" True if everything below the directory called name is filtered """
+		return name in self.directories or (self.hide_dot_files and name.startswith('.') and name not in ('.', '..'))
+
+	def isFiltered(self, path):
+		parts = path.split('/')
+
+		if len(self.suffixes) > 0 and parts[-1].endswith(self.suffixes):
+			return True
+
+		for part in parts:
+			if self.isFilteredDirectory(part):
+				return True
+
+		return False
+
+	def filter(self, changes):
+		return [item for item in changes if not self.isFiltered(item[0])]
+
+# vim: ts=4 sw=4 noexpandtab nocin ai
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#---------------------------------------------------------------------------------
+#	  _____			  _ _				 ______					   _
+#	 (_____)		 | (_)				(____  \				  (_)
+#		_	____   _ | |_  ____  ___	 ____)	)_	 _	____  ____ _  ____
+#	   | | |  _ \ / || | |/ _  |/ _ \	|  __  (| | | |/ _	|/ _  | |/ _  )
+#	  _| |_| | | ( (_| | ( ( | | |_| |	| |__)	) |_| ( ( | ( ( | | ( (/ /
+#	 (_____)_| |_|\____|_|\_|| |\___/	|______/ \____|\_|| |\_|| |_|\____)
+#						 (_____|					  (_____(_____|
+#
+#	 file: path_table
+#	 desc: Compact encoding of the change lists sent to the client.
+#
+#	 The directories are interned, each directory is sent once per session
+#	 and then referred to by number. A change list is sent as one string,
+#	 one entry per line, sorted by directory. Each entry is:
+#
+#		<status char><directory number delta>/<file name>
+#
+#	 The delta is from the directory of the previous entry and is left out
+#	 when it is zero, so most entries are the status, '/' and the name.
+#
+#  author: peter
+#	 date: 18/10/2026
+#---------------------------------------------------------------------------------
+#					  Copyright (c) 2020 Peter Antoine
+#							All rights Reserved.
+#					   Released Under the MIT Licence
+#---------------------------------------------------------------------------------
+
+
+class PathTable(object):
+	def __init__(self):
+		self.directories = {}
+
+	def canEncode(self, changes):
+		""" Names with new lines and long status codes cannot be encoded """
+		for item in changes:
+			if len(item[1]) != 1 or '\n' in item[0]:
+				return False
+
+		return True
+
+	def encode(self, changes, definitions, define_all=False):
+		""" Encode the list of (path, status) items. Directories that have
+			not been sent before are added to definitions, or every directory
+			used if define_all is set.
+		"""
+		entries = []
+
+		for item in changes:
+			(directory, _, name) = item[0].rpartition('/')
+
+			if directory not in self.directories:
+				dir_id = len(self.directories)
+				self.directories[directory] = dir_id
+				definitions[str(dir_id)] = directory
+
+			elif define_all:
+				definitions[str(self.directories[directory])] = directory
+
+			entries.append((self.directories[directory], name, item[1]))
+
+		entries.sort()
+
+		result = []
+		last_id = 0
+
+		for (dir_id, name, status) in entries:
+			if dir_id == last_id:
+				result.append(status + '/' + name)
+			else:
+				result.append(status + str(dir_id - last_id) + '/' + name)
+				last_id = dir_id
+
+		return '\n'.join(result)
+
+# vim: ts=4 sw=4 noexpandtab nocin ai
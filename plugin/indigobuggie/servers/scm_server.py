@@ -25,7 +25,13 @@ import sys
 import time
 import json
 import base64
-from threading import Event, Thread
+import hashlib
+import socket
+import tempfile
+import subprocess
+from threading import Event, Thread, Lock
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
 
 # Need to set the path up for boernlib
 current = os.path.abspath(__file__)
@@ -38,21 +44,172 @@ beorn_lib_path = os.path.join(parent, 'beorn_lib')
 sys.path.insert(1, beorn_lib_path)
 
 import beorn_lib
+import file_watcher
+from fingerprint import Fingerprint, stat_key
+from path_table import PathTable
+from path_filter import PathFilter
+from git_batch import CatFilePool
+from output_queue import OutputQueue
+import fsmonitor
+import shared_server
+
+FoundSCM = namedtuple('FoundSCM', ['type', 'primary', 'sub'])
 
 class SCMItem(object):
-	__slots__ = ('scm', 'primary', 'change_list')
+	__slots__ = ('scm', 'primary', 'changes', 'fingerprint', 'scans', 'skipped', 'snapshot_file', 'path_table', 'rescan', 'lock', 'generation', 'head', 'cat_file')
 
-	def __init__(self, scm, primary, change_list):
+	def __init__(self, scm, primary):
 		self.scm = scm
 		self.primary = primary
-		self.change_list = change_list
+		self.changes = {}
+		self.fingerprint = None
+		self.scans = 0
+		self.skipped = 0
+		self.snapshot_file = None
+		self.path_table = None
+		self.rescan = False
+		self.lock = Lock()
+		self.generation = 0
+		self.head = None
+		self.cat_file = None
+
+class AdaptivePeriod(object):
+	""" The time to wait before the next check. It drops to the minimum when
+		a check finds changes and doubles (up to the maximum) for each check
+		that does not, so idle trees are checked less and less often.
+	"""
+	def __init__(self, period, minimum, maximum):
+		self.minimum = minimum
+		self.maximum = max(minimum, maximum)
+		self.period = min(max(period, self.minimum), self.maximum)
+
+	def update(self, active):
+		if active:
+			self.period = self.minimum
+		else:
+			self.period = min(self.period * 2, self.maximum)
+
+		return self.period
+
+output_lock = Lock()
+
+# The vims connected to a shared server, None when talking to one vim on stdout.
+subscribers = None
+
+# When run inside the service host, the messages go to and come from the host.
+output_function = None
+request_source = None
+
+closedown = Event()
+
+# The messages waiting for the writer thread, None until the scm list is known.
+output_queue = None
+
+# The Source Tree ignore rules, these can be changed by the client.
+path_filter = None
+filter_changed = Event()
+
+CLOSEDOWN_CHECK = 5
+
+# Smallest number of differences that will be sent as a resync.
+RESYNC_MINIMUM = 100
+
+# The number of messages that can wait for vim before the changes are collapsed.
+OUTPUT_QUEUE_SIZE = 256
+
+# How far the server checks back off when nothing is changing.
+SERVER_BACKOFF = 8
+
+# The times a server check is run again when a local scan finished during it.
+SERVER_CHECK_RETRIES = 2
+
+# The time of the last change found by a local scan.
+last_change = 0
+
+def write_message(message):
+	if output_function is not None:
+		output_function(message)
+
+	elif subscribers is not None:
+		subscribers.send((json.dumps(message, ensure_ascii=False) + '\n').encode('utf-8'))
+	else:
+		# Workers send from different threads - keep each message whole.
+		with output_lock:
+			sys.stdout.write(json.dumps(message, ensure_ascii=False) + '\n')
+			sys.stdout.flush()
 
 def send_message(message):
-	sys.stdout.write(json.dumps(message, ensure_ascii=False) + '\n')
-	sys.stdout.flush()
+	if output_queue is not None:
+		output_queue.put(message)
+	else:
+		write_message(message)
+
+def change_message(ident, scm, changes, unchanged, define_all=False):
+	""" define_all is set for the whole state messages, these can be sent
+		before the message that first defined one of their directories.
+	"""
+	message = {}
+	message['type'] = scm.scm.getType()
+	message['root'] = scm.scm.getRoot()
+	message['ident'] = ident
+
+	if scm.path_table is not None and scm.path_table.canEncode(changes) and scm.path_table.canEncode(unchanged):
+		definitions = {}
+		message['encoding'] = 'compact'
+		message['changes'] = scm.path_table.encode(changes, definitions, define_all)
+		message['unchanged'] = scm.path_table.encode(unchanged, definitions, define_all)
+		message['dirs'] = definitions
+	else:
+		message['changes'] = list(changes)
+		message['unchanged'] = list(unchanged)
+
+	return message
+
+def write_batch(ident, messages):
+	""" Write the messages as one line, so the client handles all the
+		messages from a cycle in one go.
+	"""
+	if len(messages) == 1:
+		write_message(messages[0])
+
+	elif len(messages) > 1:
+		write_message({'ident': ident, 'batch': messages})
+
+def send_batch(ident, messages):
+	if output_queue is not None:
+		output_queue.putAll(messages)
+	else:
+		write_batch(ident, messages)
+
+def resync_message(ident, scm):
+	""" The whole state of the repository, sent when its changes have been
+		dropped from the output queue.
+	"""
+	with scm.lock:
+		message = change_message(ident, scm, list(scm.changes.items()), [], True)
+		message['resync'] = True
+		message['stats'] = {'scans': scm.scans, 'skipped': scm.skipped}
+
+	return message
+
+def create_output_queue(ident, scm_list):
+	roots = {}
+	for scm in scm_list:
+		roots[scm.scm.getRoot()] = scm
+
+	def resync_function(root):
+		result = None
+
+		if root in roots:
+			result = resync_message(ident, roots[root])
+
+		return result
+
+	return OutputQueue(lambda messages: write_batch(ident, messages), resync_function, OUTPUT_QUEUE_SIZE)
+
+def scm_list_messages(ident, scm_list):
+	messages = []
 
-def send_scm_list(ident, scm_list):
-	""" Send the list of SCMs found to the client """
 	for scm in scm_list:
 		scm_data = {}
 		scm_data['ident'] = ident
@@ -63,7 +220,393 @@ def send_scm_list(ident, scm_list):
 		scm_data['url'] = scm.scm.getUrl()
 		scm_data['user_name'] = scm.scm.getUserName()
 		scm_data['password'] = scm.scm.getPassword()
-		send_message(scm_data)
+		messages.append(scm_data)
+
+	return messages
+
+def send_scm_list(ident, scm_list):
+	""" Send the list of SCMs found to the client """
+	send_batch(ident, scm_list_messages(ident, scm_list))
+
+def snapshot_name(snapshot_dir, scm):
+	root = os.path.abspath(scm.scm.getRoot())
+	digest = hashlib.md5(root.encode('utf-8')).hexdigest()[:12]
+	return os.path.join(snapshot_dir, os.path.basename(root) + '-' + digest + '.json')
+
+def load_snapshot(scm):
+	""" Load the last changes (path -> status) that were saved for the repository """
+	result = {}
+
+	try:
+		with open(scm.snapshot_file, 'r') as f:
+			snapshot = json.load(f)
+
+		if snapshot.get('root') == scm.scm.getRoot():
+			for item in snapshot['changes']:
+				result[item[0]] = item[1]
+
+	except (IOError, OSError, ValueError, KeyError, IndexError):
+		result = {}
+
+	return result
+
+def save_snapshot(scm):
+	snapshot = {'root': scm.scm.getRoot(), 'changes': list(scm.changes.items())}
+	temp_file = scm.snapshot_file + '.tmp'
+
+	try:
+		with open(temp_file, 'w') as f:
+			json.dump(snapshot, f, ensure_ascii=False)
+
+		os.replace(temp_file, scm.snapshot_file)
+
+	except (IOError, OSError):
+		pass
+
+def replay_snapshots(ident, scm_list, snapshot_dir):
+	""" Send the changes from the last session so the tree has markers
+		straight away. The first real scan is diffed against these, so only
+		the differences get sent.
+	"""
+	if not os.path.isdir(snapshot_dir):
+		try:
+			os.makedirs(snapshot_dir)
+		except OSError:
+			return
+
+	messages = []
+
+	for scm in scm_list:
+		scm.snapshot_file = snapshot_name(snapshot_dir, scm)
+		scm.changes = load_snapshot(scm)
+
+		if len(scm.changes) > 0:
+			message = change_message(ident, scm, list(scm.changes.items()), [])
+			message['snapshot'] = True
+			messages.append(message)
+
+	send_batch(ident, messages)
+
+def diff_changes(current, changes):
+	""" Diff the changes found by a scan against the current changes
+		(path -> status) of the repository.
+
+		Returns the new path -> status map, the (path, status) items that are
+		new or have a new status, and the items that have been cleared.
+	"""
+	found = {}
+	new_changes = []
+
+	for item in changes:
+		found[item[0]] = item[1]
+
+		if current.get(item[0]) != item[1]:
+			new_changes.append((item[0], item[1]))
+
+	# If nothing is new and the sizes match then nothing has gone either.
+	if len(new_changes) == 0 and len(found) == len(current):
+		cleared = []
+	else:
+		cleared = [(path, current[path]) for path in current if path not in found]
+
+	return (found, new_changes, cleared)
+
+def git_marker(path):
+	""" The '.git' directory is only checked for existence as git changes its
+		mtime all the time.
+	"""
+	git_path = os.path.join(path, '.git')
+
+	if os.path.isdir(git_path):
+		result = 'dir'
+	else:
+		result = stat_key(git_path)
+
+	return result
+
+def discovery_key(found_scms):
+	""" The things that change when repositories are added or removed. That
+		is the markers of the repositories found, and of the current directory
+		and its parents, so a 'git init' or a clone over them is seen.
+	"""
+	result = []
+
+	for fscm in found_scms:
+		for root in list(fscm.primary) + list(fscm.sub):
+			result.append([root, os.path.isdir(root), git_marker(root), stat_key(os.path.join(root, '.gitmodules'))])
+
+	path = os.getcwd()
+
+	while True:
+		result.append([path, git_marker(path)])
+		parent = os.path.dirname(path)
+
+		if parent == path:
+			break
+
+		path = parent
+
+	return json.loads(json.dumps(result))
+
+def find_repositories(cache_dir):
+	""" Find the repositories for the current directory. The layout found
+		is cached and is used as long as none of the repository markers or
+		.gitmodules files have changed. Finding nothing is not cached, as
+		that is cheap to look for and a repository may be created later.
+	"""
+	result = None
+	cache_file = None
+
+	if cache_dir is not None:
+		cache_file = os.path.join(cache_dir, 'repositories.json')
+
+		try:
+			with open(cache_file, 'r') as f:
+				cache = json.load(f)
+
+			if cache['cwd'] == os.getcwd():
+				found = [FoundSCM(item[0], item[1], item[2]) for item in cache['repositories']]
+
+				if found and discovery_key(found) == cache['key']:
+					result = found
+
+		except (IOError, OSError, ValueError, KeyError, IndexError, TypeError):
+			result = None
+
+	if result is None:
+		result = [FoundSCM(fscm.type, list(fscm.primary), list(fscm.sub)) for fscm in beorn_lib.scm.findRepositories(None)]
+
+		if cache_file is not None and result:
+			cache = {'cwd': os.getcwd(), 'repositories': result, 'key': discovery_key(result)}
+			temp_file = cache_file + '.tmp'
+
+			try:
+				if not os.path.isdir(cache_dir):
+					os.makedirs(cache_dir)
+
+				with open(temp_file, 'w') as f:
+					json.dump(cache, f, ensure_ascii=False)
+
+				os.replace(temp_file, cache_file)
+
+			except (IOError, OSError):
+				pass
+
+	return result
+
+def encode_value(value):
+	""" Convert the results of the SCM calls into something json can send.
+		The named tuples and objects are sent with their field names so the
+		client can rebuild them.
+	"""
+	if hasattr(value, '_asdict'):
+		result = {'__class__': type(value).__name__, 'fields': encode_value(dict(value._asdict()))}
+
+	elif isinstance(value, dict):
+		result = {}
+		for key in value:
+			result[key] = encode_value(value[key])
+
+	elif isinstance(value, (list, tuple, set)):
+		result = [encode_value(item) for item in value]
+
+	elif isinstance(value, bytes):
+		result = value.decode('utf-8', 'replace')
+
+	elif value is None or isinstance(value, (str, int, float, bool)):
+		result = value
+
+	elif hasattr(value, '__dict__'):
+		result = {'__class__': type(value).__name__, 'fields': encode_value(vars(value))}
+
+	else:
+		result = str(value)
+
+	return result
+
+def read_file(scm, path, version):
+	""" Read the file with the running cat-file if there is one, if that
+		fails the scm is asked so it can raise the error.
+	"""
+	result = None
+
+	if scm.cat_file is not None:
+		try:
+			result = scm.cat_file.getFile(path, version)
+		except (IOError, OSError, ValueError):
+			result = None
+
+	if result is None:
+		result = scm.scm.getFile(path, version)
+
+	return result
+
+def run_request(scm, request):
+	result = None
+
+	if request['request'] == 'history':
+		result = scm.scm.getHistory(request['path'], max_entries=request.get('max_entries'))
+
+	elif request['request'] == 'file':
+		if request.get('version') is None:
+			result = scm.scm.getFile(request['path'])
+		else:
+			result = read_file(scm, request['path'], request['version'])
+
+	elif request['request'] == 'patch':
+		result = scm.scm.getPatch(request['version'])
+
+	elif request['request'] == 'commit_details':
+		result = scm.scm.getCommitDetails(request['version'])
+
+	else:
+		raise ValueError("unknown request: " + str(request['request']))
+
+	return result
+
+def handle_request(ident, scm_list, request, reply):
+	message = {}
+	message['ident'] = ident
+	message['response_id'] = request.get('request_id')
+	message['request'] = request.get('request')
+	message['result'] = None
+
+	try:
+		for scm in scm_list:
+			if scm.scm.getRoot() == request.get('root') and scm.scm.getType() == request.get('type'):
+				message['result'] = encode_value(run_request(scm, request))
+				break
+		else:
+			message['error'] = 'no repository at: ' + str(request.get('root'))
+
+	except Exception as e:
+		message['error'] = str(e)
+
+	reply(message)
+
+def set_filters(scm_list, request):
+	""" Replace the ignore rules. Every repository is scanned again on the
+		next cycle, so the changes for the newly ignored files are cleared
+		and the ones that are no longer ignored are sent.
+	"""
+	global path_filter
+
+	path_filter = PathFilter.fromParameters(request.get('filters'))
+
+	for scm in scm_list:
+		scm.rescan = True
+
+	filter_changed.set()
+
+def send_resync(ident, scm_list, root):
+	""" The client could not decode the changes for root, send it all again """
+	for scm in scm_list:
+		if scm.scm.getRoot() == root:
+			send_message(resync_message(ident, scm))
+
+def read_requests(ident, scm_list, request_pool, source, reply):
+	""" Run the requests read from source on the request pool, so a slow
+		request does not stop the ones behind it. Returns when the source
+		is closed.
+	"""
+	for line in source:
+		line = line.strip()
+
+		if line != '':
+			try:
+				request = json.loads(line)
+
+				if request.get('request') == 'filters':
+					set_filters(scm_list, request)
+
+				elif request.get('request') == 'resync':
+					send_resync(ident, scm_list, request.get('root'))
+				else:
+					request_pool.submit(handle_request, ident, scm_list, request, reply)
+
+			except ValueError:
+				pass
+
+def request_function(ident, scm_list):
+	""" Read the requests from vim. When vim closes the channel the server
+		is shut down.
+	"""
+	request_pool = ThreadPoolExecutor(max_workers=2)
+
+	read_requests(ident, scm_list, request_pool, request_source or sys.stdin, send_message)
+
+	closedown.set()
+	request_pool.shutdown(wait=False)
+
+def state_messages(ident, scm_list):
+	""" The repositories and all their changes, for a new subscriber """
+	messages = scm_list_messages(ident, scm_list)
+
+	for scm in scm_list:
+		with scm.lock:
+			if len(scm.changes) > 0:
+				message = change_message(ident, scm, list(scm.changes.items()), [], True)
+				message['resync'] = True
+				messages.append(message)
+
+	return messages
+
+def subscriber_function(ident, scm_list, request_pool, listener, connection):
+	def greeting():
+		message = {'ident': ident, 'batch': state_messages(ident, scm_list)}
+		return (json.dumps(message, ensure_ascii=False) + '\n').encode('utf-8')
+
+	subscribers.add(connection, greeting)
+
+	def reply(message):
+		subscribers.sendTo(connection, (json.dumps(message, ensure_ascii=False) + '\n').encode('utf-8'))
+
+	try:
+		read_requests(ident, scm_list, request_pool, connection.makefile('r', encoding='utf-8', errors='replace'), reply)
+	except (IOError, OSError):
+		pass
+
+	if subscribers.remove(connection) == 0:
+		# the last vim has gone, stop new ones from joining a dying server.
+		listener.close()
+		closedown.set()
+
+	connection.close()
+
+def listen_function(ident, scm_list, listener):
+	""" Accept the vims that want to share this server """
+	request_pool = ThreadPoolExecutor(max_workers=2)
+
+	while not closedown.is_set():
+		try:
+			connection = listener.accept(CLOSEDOWN_CHECK)
+		except socket.timeout:
+			continue
+		except OSError:
+			break
+
+		Thread(target=subscriber_function, args=(ident, scm_list, request_pool, listener, connection), daemon=True).start()
+
+	request_pool.shutdown(wait=False)
+
+def is_filtered_directory(name):
+	""" The current filter, as it can be changed by the client """
+	return path_filter is not None and path_filter.isFilteredDirectory(name)
+
+def repository_key(parameters):
+	""" The repositories the server is for, so the vims started anywhere in
+		the same checkout share one server.
+	"""
+	roots = []
+
+	for fscm in find_repositories(parameters.get('snapshot_dir')):
+		if 'enabled_scms' not in parameters or fscm.type in parameters['enabled_scms']:
+			roots += [os.path.realpath(item) for item in list(fscm.primary) + list(fscm.sub)]
+
+	if len(roots) == 0:
+		return None
+
+	return '\n'.join(sorted(roots))
 
 def create_scm(scm_list, scm_type, primary, working_dir, parameters):
 	result = None
@@ -79,88 +622,504 @@ def create_scm(scm_list, scm_type, primary, working_dir, parameters):
 		result = beorn_lib.scm.create(scm_type, working_dir=working_dir);
 
 	if result:
-		scm_list.append(SCMItem(result, primary, []))
+		scm_list.append(SCMItem(result, primary))
+
+def thread_function(parameters, ident, listener=None):
+	global path_filter, output_queue
+
+	path_filter = PathFilter.fromParameters(parameters.get('filters'))
+
+	scm_list = []
+
+	if 'shard_roots' in parameters:
+		# a worker of a sharded server, the supervisor found the repositories.
+		for (scm_type, primary, root) in parameters['shard_roots']:
+			create_scm(scm_list, scm_type, primary, root, parameters)
+	else:
+		for fscm in find_repositories(parameters.get('snapshot_dir')):
+			if 'enabled_scms' not in parameters or fscm.type in parameters['enabled_scms']:
+				# If we don't have a valid configuration turn them all on.
+				for item in fscm.primary:
+					create_scm(scm_list, fscm.type, True, item, parameters)
 
-def thread_function(parameters, ident):
-	found_scms = beorn_lib.scm.findRepositories(None)
+				for item in fscm.sub:
+					create_scm(scm_list, fscm.type, False, item, parameters)
 
+	shard_count = min(int(parameters.get('shard_workers', 1)), len(scm_list))
+
+	if shard_count > 1 and listener is None and 'shard_roots' not in parameters:
+		# The workers have their own output queues, the supervisor writes
+		# straight out so a slow vim backs up into them.
+		send_scm_list(ident, scm_list)
+		run_shards(ident, parameters, scm_list, shard_count)
+	else:
+		# From here the messages are written by their own thread, so the scans
+		# do not wait for vim to read them.
+		output_queue = create_output_queue(ident, scm_list)
+
+		if 'shard_roots' not in parameters:
+			send_scm_list(ident, scm_list)
+
+		run_scms(ident, parameters, scm_list, listener)
+
+		output_queue.close()
+
+def run_scms(ident, parameters, scm_list, listener):
+	""" Keep the changes of the repositories up to date until closedown """
 	poll_period = int(parameters['poll_period'])
 	server_period = int(parameters['server_period'])
 
-	scm_list = []
+	if parameters.get('adaptive_polling', False) in (True, 'True'):
+		local_period = AdaptivePeriod(	poll_period,
+										int(parameters.get('min_poll_period', poll_period)),
+										int(parameters.get('max_poll_period', poll_period)))
+		server_check_period = AdaptivePeriod(server_period, server_period, server_period * SERVER_BACKOFF)
+	else:
+		local_period = AdaptivePeriod(poll_period, poll_period, poll_period)
+		server_check_period = AdaptivePeriod(server_period, server_period, server_period)
 
-	for fscm in found_scms:
-		if 'enabled_scms' not in parameters or fscm.type in parameters['enabled_scms']:
-			# If we don't have a valid configuration turn them all on.
-			for item in fscm.primary:
-				create_scm(scm_list, fscm.type, True, item, parameters)
+	# The directory numbers are per client, so cannot be used when shared.
+	if parameters.get('compact_messages', True) in (True, 'True') and listener is None:
+		for scm in scm_list:
+			scm.path_table = PathTable()
 
-			for item in fscm.sub:
-				create_scm(scm_list, fscm.type, False, item, parameters)
+	if parameters.get('snapshot_dir') is not None:
+		replay_snapshots(ident, scm_list, parameters['snapshot_dir'])
+
+	# The scm list is complete so can now answer requests from the client.
+	if listener is not None:
+		request_thread = Thread(target=listen_function, args=(ident, scm_list, listener), daemon=True)
+	else:
+		request_thread = Thread(target=request_function, args=(ident, scm_list), daemon=True)
 
-	send_scm_list(ident, scm_list)
+	request_thread.start()
 
-	# Update first - before we hit the wait loop.
+	roots = [scm.scm.getRoot() for scm in scm_list]
+
+	# a shard worker also has to skip the repositories of the other workers.
+	all_roots = parameters.get('all_roots', roots)
+
+	# Only git has local metadata that will show all the changes to the status.
 	for scm in scm_list:
-		update_source_tree(ident, scm, True)
+		if scm.scm.getType() == 'Git':
+			scm.fingerprint = Fingerprint(scm.scm.getRoot(), all_roots, is_filtered_directory)
+			scm.cat_file = CatFilePool(scm.scm.getRoot())
 
-	now = int(time.time())
-	next_local_check = now + poll_period
-	next_server_check = now + server_period
+	# start watching before the first update, so nothing is missed in between.
+	watcher = None
 
-	timeout_time = min(next_server_check, next_local_check)
+	if parameters.get('use_file_watcher', True) in (True, 'True'):
+		watcher = file_watcher.create_watcher(roots, exclude=all_roots, is_filtered=is_filtered_directory)
 
-	while closedown.wait(timeout_time - now) is False:
-		check_server = False
+	# Let git status use the watcher to only check the files that changed.
+	# The journals must be outside of the watched trees.
+	journals = []
+	journal_dir = None
 
-		if int(time.time()) >= next_server_check:
-			check_server = True
+	if watcher is not None and parameters.get('use_fsmonitor', True) in (True, 'True'):
+		journal_dir = tempfile.mkdtemp(prefix='indigobuggie-')
 
 		for scm in scm_list:
-			update_source_tree(ident, scm, check_server)
+			if scm.scm.getType() == 'Git':
+				try:
+					journal = fsmonitor.Journal(journal_dir, scm.scm.getRoot())
+					watcher.setJournal(scm.scm.getRoot(), journal)
+					journals.append(journal)
 
-		# take the time again as updating may take a while
-		now = int(time.time())
-		if check_server is True:
-			next_server_check = now + server_period
+				except (IOError, OSError):
+					pass
+
+		if len(journals) > 0:
+			fsmonitor.enable_hook(journal_dir)
+
+	# Limit the number of repositories that are updated at the same time.
+	pool = None
+	max_workers = int(parameters.get('max_workers', 4))
+
+	if max_workers > 1 and len(scm_list) > 1:
+		pool = ThreadPoolExecutor(max_workers=max_workers)
+
+	# Update first - before we hit the wait loop. The watcher will tell us
+	# which directories to fingerprint, so no need to walk the tree for it.
+	if watcher is not None:
+		send_batch(ident, refresh_scms(ident, pool, [(scm, False, []) for scm in scm_list]))
+	else:
+		send_batch(ident, refresh_scms(ident, pool, [(scm, False, None) for scm in scm_list]))
+
+	# The server checks have their own thread, so a slow remote does not
+	# hold up the local changes.
+	server_thread = Thread(target=server_loop, args=(ident, scm_list, max_workers, server_check_period), daemon=True)
+	server_thread.start()
+
+	use_polling = watcher is None
+
+	if watcher is not None:
+		use_polling = not watch_loop(ident, scm_list, pool, watcher)
+		watcher.close()
+
+		if use_polling:
+			# Out of watches, the journals have missed changes and will not
+			# get any more, so git has to go back to checking everything.
+			for journal in journals:
+				journal.invalidate()
+
+			if len(journals) > 0:
+				fsmonitor.disable_hook()
+
+			for scm in scm_list:
+				scm.rescan = True
+
+	if use_polling:
+		poll_loop(ident, scm_list, pool, local_period)
+
+	if pool is not None:
+		pool.shutdown()
+
+	for scm in scm_list:
+		if scm.cat_file is not None:
+			scm.cat_file.close()
+
+	for journal in journals:
+		journal.close()
+
+	if journal_dir is not None:
+		try:
+			os.rmdir(journal_dir)
+		except OSError:
+			pass
+
+def start_shard(ident, parameters, shard, all_roots):
+	""" Start a worker process for the (type, primary, root) items of shard """
+	worker_parameters = dict(parameters)
+	worker_parameters['shard_roots'] = shard
+	worker_parameters['all_roots'] = all_roots
+	worker_parameters['shard_workers'] = 1
+	worker_parameters['shared_server'] = False
+
+	encoded = base64.b64encode(json.dumps(worker_parameters).encode('utf-8')).decode('ascii')
+
+	return subprocess.Popen([sys.executable, os.path.abspath(__file__), ident, encoded],
+							cwd=os.getcwd(),
+							stdin=subprocess.PIPE,
+							stdout=subprocess.PIPE,
+							stderr=subprocess.DEVNULL)
+
+def shard_output_function(ident, worker):
+	""" Pass the messages from a worker on to the client """
+	for line in worker.stdout:
+		try:
+			message = json.loads(line.decode('utf-8', 'replace'))
+		except ValueError:
+			continue
+
+		if 'batch' in message:
+			write_batch(ident, message['batch'])
 		else:
-			next_local_check = now + poll_period
+			write_message(message)
 
-		timeout_time = min(next_server_check, next_local_check)
+def route_requests(ident, source, workers, owners):
+	""" Send each request to the worker that has its repository, the
+		filters go to all of them.
+	"""
+	for line in source:
+		line = line.strip()
 
-def update_source_tree(ident, scm, check_server):
-	changes = scm.scm.getTreeChanges(check_server=check_server)
+		if line != '':
+			try:
+				request = json.loads(line)
+			except ValueError:
+				continue
 
-	if changes is not None and (len(changes) > 0 or len(scm.change_list) > 0):
-		new_changes = set(changes) - set(scm.change_list)
-		unchanged = set(scm.change_list) - set(changes)
+			if request.get('request') == 'filters':
+				targets = workers
 
-		if len(new_changes) + len(unchanged) > 0:
-			message = {}
-			message['type'] = scm.scm.getType()
-			message['root'] = scm.scm.getRoot()
-			message['ident'] = ident
-			message['changes'] = list(new_changes)
-			message['unchanged'] = list(unchanged)
-			send_message(message)
+			elif request.get('root') in owners:
+				targets = [owners[request['root']]]
 
-		scm.change_list = list(changes)
+			else:
+				targets = []
+				write_message({	'ident': ident,
+								'response_id': request.get('request_id'),
+								'request': request.get('request'),
+								'result': None,
+								'error': 'no repository at: ' + str(request.get('root'))})
 
+			for worker in targets:
+				try:
+					worker.stdin.write((line + '\n').encode('utf-8'))
+					worker.stdin.flush()
+				except (IOError, OSError):
+					pass
 
+def run_shards(ident, parameters, scm_list, shard_count):
+	""" Split the repositories by root between shard_count worker processes.
+		This process only passes the requests to the workers and their
+		messages back, until vim closes the channel.
+	"""
+	all_roots = [scm.scm.getRoot() for scm in scm_list]
+	shards = [[] for _ in range(shard_count)]
 
-if __name__ == "__main__":
-	closedown = Event()
-	closedown.clear()
+	for (index, scm) in enumerate(sorted(scm_list, key=lambda item: item.scm.getRoot())):
+		shards[index % shard_count].append((scm.scm.getType(), scm.primary, scm.scm.getRoot()))
+
+	workers = []
+	owners = {}
+	output_threads = []
+
+	for shard in shards:
+		try:
+			worker = start_shard(ident, parameters, shard, all_roots)
+		except (IOError, OSError):
+			continue
+
+		workers.append(worker)
 
+		for (_, _, root) in shard:
+			owners[root] = worker
+
+		output_thread = Thread(target=shard_output_function, args=(ident, worker), daemon=True)
+		output_thread.start()
+		output_threads.append(output_thread)
+
+	route_requests(ident, request_source or sys.stdin, workers, owners)
+
+	# the workers close down when their input closes.
+	for worker in workers:
+		try:
+			worker.stdin.close()
+		except (IOError, OSError):
+			pass
+
+	for worker in workers:
+		try:
+			worker.wait(CLOSEDOWN_CHECK * 2)
+		except subprocess.TimeoutExpired:
+			worker.kill()
+
+	for output_thread in output_threads:
+		output_thread.join(CLOSEDOWN_CHECK)
+
+def refresh_scms(ident, pool, updates):
+	""" Update the list of (scm, check_server, touched) items.
+
+		This waits for all the updates to finish and returns the messages
+		for the cycle so they can be sent as one batch.
+	"""
+	result = []
+
+	if pool is None or len(updates) < 2:
+		for (scm, check_server, touched) in updates:
+			result.append(update_source_tree(ident, scm, check_server, touched))
+	else:
+		jobs = []
+		for (scm, check_server, touched) in updates:
+			jobs.append(pool.submit(update_source_tree, ident, scm, check_server, touched))
+
+		for job in jobs:
+			result.append(job.result())
+
+	return [message for message in result if message is not None]
+
+def poll_loop(ident, scm_list, pool, poll_period):
+	next_check = time.time() + poll_period.period
+
+	# wake up now and again to see if the filters have been changed.
+	while closedown.wait(max(0, min(next_check - time.time(), CLOSEDOWN_CHECK))) is False:
+		if time.time() < next_check and not filter_changed.is_set():
+			continue
+
+		filter_changed.clear()
+		messages = refresh_scms(ident, pool, [(scm, False, None) for scm in scm_list])
+		send_batch(ident, messages)
+
+		# take the time again as updating may take a while
+		next_check = time.time() + poll_period.update(len(messages) > 0)
+
+def watch_loop(ident, scm_list, pool, watcher):
+	""" Only the repositories that the watcher says have changed are scanned.
+
+		Returns False if the watcher has failed (the watch limit was hit)
+		and the caller has to poll, else True at closedown.
+	"""
+	roots = {}
+	for scm in scm_list:
+		roots[os.path.abspath(scm.scm.getRoot())] = scm
+
+	while not closedown.is_set():
+		try:
+			# wake up now and again to see if the server has been closed down.
+			touched = watcher.wait(CLOSEDOWN_CHECK)
+
+			if filter_changed.is_set():
+				filter_changed.clear()
+				watcher.refresh()
+
+		except OSError:
+			return False
+
+		for root in roots:
+			if roots[root].rescan:
+				touched.setdefault(root, [])
+
+		send_batch(ident, refresh_scms(ident, pool, [(roots[root], False, touched[root]) for root in touched if root in roots]))
+
+	return True
+
+def server_loop(ident, scm_list, max_workers, server_period):
+	""" Check all the repositories against their servers every server_period.
+		The period backs off when the checks and the local scans have not
+		found any changes since the last check.
+
+		This has its own workers, so a hung remote check only holds up the
+		other server checks and never the local scans.
+	"""
+	pool = None
+
+	if max_workers > 1 and len(scm_list) > 1:
+		pool = ThreadPoolExecutor(max_workers=max_workers)
+
+	last_check = 0
+
+	while not closedown.is_set():
+		check_time = time.time()
+		messages = refresh_scms(ident, pool, [(scm, True, None) for scm in scm_list])
+		active = len(messages) > 0 or last_change >= last_check
+		last_check = check_time
+
+		for scm in scm_list:
+			messages.append(stats_message(ident, scm))
+
+		send_batch(ident, messages)
+
+		if closedown.wait(server_period.update(active)):
+			break
+
+	if pool is not None:
+		pool.shutdown(wait=False)
+
+def stats_message(ident, scm):
+	message = {}
+	message['type'] = scm.scm.getType()
+	message['root'] = scm.scm.getRoot()
+	message['ident'] = ident
+	message['stats'] = {'scans': scm.scans, 'skipped': scm.skipped}
+	return message
+
+def update_source_tree(ident, scm, check_server, touched=None):
+	""" Returns the change message for the repository, or None if nothing
+		has changed.
+
+		The local scans and the server checks of a repository can run at the
+		same time, the slow part is done outside the lock and only the
+		update of the change list is done inside it.
+	"""
+	global last_change
+
+	message = None
+
+	if check_server is False:
+		if scm.fingerprint is not None:
+			# Take the fingerprint before the status, so anything that changes
+			# during the scan is seen on the next cycle.
+			if scm.fingerprint.update(touched) is False and scm.rescan is False:
+				scm.skipped += 1
+				return None
+
+		scm.rescan = False
+
+	retries = SERVER_CHECK_RETRIES
+
+	while True:
+		scm.scans += 1
+		generation = scm.generation
+
+		head = None
+		if scm.fingerprint is not None:
+			head = scm.fingerprint.head()
+
+		changes = scm.scm.getTreeChanges(check_server=check_server)
+
+		if changes is not None and path_filter is not None:
+			changes = path_filter.filter(changes)
+
+		if check_server is False or generation == scm.generation or retries == 0:
+			break
+
+		# a local scan finished while waiting for the server, so the local
+		# part of these changes may be older than the ones sent. Check again.
+		retries -= 1
+
+	with scm.lock:
+		if check_server is False:
+			scm.generation += 1
+
+		elif generation != scm.generation:
+			# still outrun by the local scans, the server state is used and
+			# the next local scan puts back anything that is older.
+			scm.rescan = True
+			head = None
+
+		if changes is not None:
+			(scm.changes, new_changes, unchanged) = diff_changes(scm.changes, changes)
+
+			differences = len(new_changes) + len(unchanged)
+
+			# A checkout (or reset) can change most of the tree, so send the
+			# whole state so the client can rebuild it in one go.
+			if differences > 0 and ((head is not None and scm.head is not None and head != scm.head) or
+									differences > max(RESYNC_MINIMUM, len(scm.changes))):
+				message = change_message(ident, scm, list(scm.changes.items()), [], True)
+				message['resync'] = True
+
+			elif differences > 0:
+				message = change_message(ident, scm, new_changes, unchanged)
+
+			if message is not None:
+				message['stats'] = {'scans': scm.scans, 'skipped': scm.skipped}
+
+				if touched:
+					message['touched'] = touched
+
+				if check_server is False:
+					last_change = time.time()
+
+			if scm.snapshot_file is not None and differences > 0:
+				save_snapshot(scm)
+
+		if head is not None:
+			scm.head = head
+
+	return message
+
+if __name__ == "__main__":
 	if sys.argv[2] == 'test':
 		parameters = json.loads('{"enabled_scms": ["Git"], "server_period": "6", "scm_config": {"Git": {"server": "", "repo_url": "None", "working_dir": ".", "user_name": "", "password": ""}}, "poll_period": "60"}')
 	else:
 		parameters = json.loads(base64.b64decode(sys.argv[2]))
 
-	x = Thread(target=thread_function, args=(parameters, sys.argv[1]))
+	listener = None
+
+	if parameters.get('shared_server', False) in (True, 'True') and shared_server.is_supported():
+		socket_path = shared_server.socket_name(parameters.get('snapshot_dir') or tempfile.gettempdir(), repository_key(parameters))
+
+		if len(sys.argv) > 3 and sys.argv[3] == 'shared':
+			# started by the proxy below, if another server got there first then give up.
+			subscribers = shared_server.Subscribers()
+			listener = shared_server.create_listener(socket_path)
+
+			if listener is None:
+				sys.exit(0)
+
+		elif shared_server.run_proxy(socket_path, [sys.executable, os.path.abspath(__file__), sys.argv[1], sys.argv[2], 'shared']):
+			sys.exit(0)
+
+	x = Thread(target=thread_function, args=(parameters, sys.argv[1], listener))
 	x.start()
 
 	# wait for the thread to finish
 	x.join()
 
+	if listener is not None:
+		listener.close()
+
 # vim: ts=4 sw=4 noexpandtab nocin ai
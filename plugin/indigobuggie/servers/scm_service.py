@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#---------------------------------------------------------------------------------
+#	  _____			  _ _				 ______					   _
+#	 (_____)		 | (_)				(____  \				  (_)
+#		_	____   _ | |_  ____  ___	 ____)	)_	 _	____  ____ _  ____
+#	   | | |  _ \ / || | |/ _  |/ _ \	|  __  (| | | |/ _	|/ _  | |/ _  )
+#	  _| |_| | | ( (_| | ( ( | | |_| |	| |__)	) |_| ( ( | ( ( | | ( (/ /
+#	 (_____)_| |_|\____|_|\_|| |\___/	|______/ \____|\_|| |\_|| |_|\____)
+#						 (_____|					  (_____(_____|
+#
+#	 file: scm_service
+#	 desc: The scm server run as a service of the service host.
+#
+#  author: peter
+#	 date: 18/10/2026
+#---------------------------------------------------------------------------------
+#					  Copyright (c) 2020 Peter Antoine
+#							All rights Reserved.
+#					   Released Under the MIT Licence
+#---------------------------------------------------------------------------------
+
+from queue import Queue
+from threading import Thread
+from service_host import Service
+
+import scm_server
+
+
+class SCMService(Service):
+	def start(self):
+		self.requests = Queue()
+
+		# set by the last stop of the service.
+		scm_server.closedown.clear()
+
+		scm_server.output_function = self.send
+		scm_server.request_source = self.requestLines()
+
+		self.server_thread = Thread(target=scm_server.thread_function, args=(self.parameters, self.ident), daemon=True)
+		self.server_thread.start()
+
+	def requestLines(self):
+		while True:
+			line = self.requests.get()
+
+			if line is None:
+				break
+
+			yield line
+
+	def onMessage(self, line):
+		self.requests.put(line)
+
+	def onStop(self):
+		scm_server.closedown.set()
+		self.requests.put(None)
+		self.server_thread.join(scm_server.CLOSEDOWN_CHECK * 2)
+
+# vim: ts=4 sw=4 noexpandtab nocin ai
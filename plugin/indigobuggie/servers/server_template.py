@@ -0,0 +1,318 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#---------------------------------------------------------------------------------
+#	  _____			  _ _				 ______					   _
+#	 (_____)		 | (_)				(____  \				  (_)
+#		_	____   _ | |_  ____  ___	 ____)	)_	 _	____  ____ _  ____
+#	   | | |  _ \ / || | |/ _  |/ _ \	|  __  (| | | |/ _	|/ _  | |/ _  )
+#	  _| |_| | | ( (_| | ( ( | | |_| |	| |__)	) |_| ( ( | ( ( | | ( (/ /
+#	 (_____)_| |_|\____|_|\_|| |\___/	|______/ \____|\_|| |\_|| |_|\____)
+#						 (_____|					  (_____(_____|
+#
+#	 file: server_template
+#	 desc: A pre-loaded python that the background servers are forked from.
+#
+#	 Vim starts the template once, it imports the server modules and waits on
+#	 a unix socket. A server is started with a small launcher:
+#
+#		python3 -S server_template.py launch <socket> <server.py> <args...>
+#
+#	 The launcher passes its stdin, stdout and stderr to the template, which
+#	 forks and runs the server on them. So the server does not have to wait
+#	 for python to start and import beorn_lib. The launcher stays running
+#	 until the server exits, so vim sees the job end as it did before. If
+#	 the template is not running the launcher runs the server itself.
+#
+#  author: peter
+#	 date: 18/10/2026
+#---------------------------------------------------------------------------------
+#					  Copyright (c) 2020 Peter Antoine
+#							All rights Reserved.
+#					   Released Under the MIT Licence
+#---------------------------------------------------------------------------------
+
+import os
+import sys
+import json
+import array
+import signal
+import socket
+import select
+
+# The modules the servers use, so the forked servers find them loaded.
+PRELOAD = ['base64', 'hashlib', 'tempfile', 'concurrent.futures', 'scm_server', 'scm_service', 'service_host', 'timekeeper_service']
+
+# How long the template waits for a launcher to send its request.
+REQUEST_TIMEOUT = 5
+
+# How often the template checks for servers that have exited.
+REAP_PERIOD = 0.5
+
+MAX_REQUEST = 1024 * 1024
+
+
+def send_request(connection, request):
+	""" Send the request and the stdin, stdout and stderr of this process """
+	data = json.dumps(request).encode('utf-8') + b'\n'
+	fds = array.array('i', [0, 1, 2])
+
+	sent = connection.sendmsg([data], [(socket.SOL_SOCKET, socket.SCM_RIGHTS, fds.tobytes())])
+	connection.sendall(data[sent:])
+
+
+def receive_request(connection):
+	""" Returns (request, fds) or (None, fds) if the request is not valid """
+	fds = array.array('i')
+	data = b''
+
+	(chunk, ancdata, _, _) = connection.recvmsg(64 * 1024, socket.CMSG_LEN(3 * fds.itemsize))
+
+	for (level, kind, fd_data) in ancdata:
+		if level == socket.SOL_SOCKET and kind == socket.SCM_RIGHTS:
+			fds.frombytes(fd_data[:len(fd_data) - (len(fd_data) % fds.itemsize)])
+
+	while chunk != b'':
+		data += chunk
+
+		if data.endswith(b'\n') or len(data) > MAX_REQUEST:
+			break
+
+		chunk = connection.recv(64 * 1024)
+
+	try:
+		request = json.loads(data.decode('utf-8'))
+	except ValueError:
+		request = None
+
+	if len(fds) != 3:
+		request = None
+
+	return (request, list(fds))
+
+
+def run_server(request, fds, keep):
+	""" Runs in the forked child, never returns """
+	import runpy
+
+	exit_code = 1
+
+	try:
+		for item in keep:
+			item.close()
+
+		for (index, fd) in enumerate(fds):
+			os.dup2(fd, index)
+			os.close(fd)
+
+		os.chdir(request['cwd'])
+		os.environ.clear()
+		os.environ.update(request['env'])
+
+		sys.argv = request['argv']
+		sys.path[0] = os.path.dirname(os.path.abspath(sys.argv[0]))
+
+		try:
+			runpy.run_path(sys.argv[0], run_name='__main__')
+			exit_code = 0
+
+		except SystemExit as e:
+			if e.code is None:
+				exit_code = 0
+			elif isinstance(e.code, int):
+				exit_code = e.code
+
+	except BaseException:
+		import traceback
+		traceback.print_exc()
+
+	finally:
+		try:
+			sys.stdout.flush()
+			sys.stderr.flush()
+		except (IOError, OSError, ValueError):
+			pass
+
+		os._exit(exit_code)
+
+
+def start_server(listener, connection, servers):
+	connection.settimeout(REQUEST_TIMEOUT)
+
+	try:
+		(request, fds) = receive_request(connection)
+
+	except OSError:
+		connection.close()
+		return
+
+	if request is None:
+		for fd in fds:
+			os.close(fd)
+
+		connection.close()
+		return
+
+	pid = os.fork()
+
+	if pid == 0:
+		run_server(request, fds, [listener, connection] + list(servers.values()))
+
+	for fd in fds:
+		os.close(fd)
+
+	try:
+		connection.sendall(('pid ' + str(pid) + '\n').encode('ascii'))
+	except OSError:
+		pass
+
+	servers[pid] = connection
+
+
+def reap_servers(servers):
+	""" Tell the launchers of the servers that have exited """
+	while len(servers) > 0:
+		try:
+			(pid, status) = os.waitpid(-1, os.WNOHANG)
+		except ChildProcessError:
+			break
+
+		if pid == 0:
+			break
+
+		connection = servers.pop(pid, None)
+
+		if connection is not None:
+			if os.WIFEXITED(status):
+				exit_code = os.WEXITSTATUS(status)
+			else:
+				exit_code = 1
+
+			try:
+				connection.sendall(('exit ' + str(exit_code) + '\n').encode('ascii'))
+			except OSError:
+				pass
+
+			connection.close()
+
+
+def run_template(socket_path):
+	""" Serve until vim closes the stdin of the template """
+	for name in PRELOAD:
+		try:
+			__import__(name)
+		except Exception:
+			pass
+
+	listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+
+	try:
+		os.unlink(socket_path)
+	except OSError:
+		pass
+
+	listener.bind(socket_path)
+	listener.listen(8)
+
+	servers = {}
+	running = True
+
+	while running:
+		(readable, _, _) = select.select([listener, 0], [], [], REAP_PERIOD)
+
+		if 0 in readable and os.read(0, 4096) == b'':
+			running = False
+
+		elif listener in readable:
+			try:
+				(connection, _) = listener.accept()
+				start_server(listener, connection, servers)
+			except OSError:
+				pass
+
+		reap_servers(servers)
+
+	listener.close()
+
+	try:
+		os.unlink(socket_path)
+	except OSError:
+		pass
+
+
+def run_launcher(socket_path, server_args):
+	""" Start the server in the template and wait for it to exit. Returns the
+		exit code of the server, or None if the template could not be used.
+	"""
+	connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+
+	try:
+		connection.connect(socket_path)
+		send_request(connection, {'argv': server_args, 'cwd': os.getcwd(), 'env': dict(os.environ)})
+
+	except OSError:
+		connection.close()
+		return None
+
+	server_pid = None
+	exit_code = None
+	data = b''
+
+	def stop_server(signal_number, frame):
+		if server_pid is not None:
+			os.kill(server_pid, signal.SIGTERM)
+		os._exit(1)
+
+	signal.signal(signal.SIGTERM, stop_server)
+	signal.signal(signal.SIGHUP, stop_server)
+
+	try:
+		chunk = connection.recv(1024)
+
+		while chunk != b'':
+			data += chunk
+
+			while b'\n' in data:
+				(line, _, data) = data.partition(b'\n')
+				(kind, _, value) = line.decode('ascii', 'replace').partition(' ')
+
+				if kind == 'pid' and value.isdigit():
+					server_pid = int(value)
+				elif kind == 'exit' and value.isdigit():
+					exit_code = int(value)
+
+			chunk = connection.recv(1024)
+
+	except OSError:
+		pass
+
+	connection.close()
+
+	if server_pid is None:
+		# the template closed before it started the server.
+		return None
+
+	if exit_code is None:
+		exit_code = 1
+
+	return exit_code
+
+
+def main():
+	if len(sys.argv) > 2 and sys.argv[1] == 'template':
+		run_template(sys.argv[2])
+
+	elif len(sys.argv) > 3 and sys.argv[1] == 'launch':
+		exit_code = run_launcher(sys.argv[2], sys.argv[3:])
+
+		if exit_code is not None:
+			sys.exit(exit_code)
+
+		# no template, run the server the slow way.
+		sys.stdout.flush()
+		os.execv(sys.executable, [sys.executable] + sys.argv[3:])
+
+
+if __name__ == "__main__":
+	main()
+
+# vim: ts=4 sw=4 noexpandtab nocin ai
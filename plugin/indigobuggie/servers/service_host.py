@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#---------------------------------------------------------------------------------
+#	  _____			  _ _				 ______					   _
+#	 (_____)		 | (_)				(____  \				  (_)
+#		_	____   _ | |_  ____  ___	 ____)	)_	 _	____  ____ _  ____
+#	   | | |  _ \ / || | |/ _  |/ _ \	|  __  (| | | |/ _	|/ _  | |/ _  )
+#	  _| |_| | | ( (_| | ( ( | | |_| |	| |__)	) |_| ( ( | ( ( | | ( (/ /
+#	 (_____)_| |_|\____|_|\_|| |\___/	|______/ \____|\_|| |\_|| |_|\____)
+#						 (_____|					  (_____(_____|
+#
+#	 file: service_host
+#	 desc: One background process that runs many named services.
+#
+#	 Every line on the channel (both ways) is the name of the service, a tab
+#	 and the message for that service. The lines for 'host' control the
+#	 services:
+#
+#		host	{"start": <name>, "parameters": {...}}
+#		host	{"stop": <name>}
+#
+#	 Each service runs on its own thread with its own scheduler, so a slow
+#	 service does not hold up the others. The host exits when vim closes the
+#	 channel.
+#
+#  author: peter
+#	 date: 18/10/2026
+#---------------------------------------------------------------------------------
+#					  Copyright (c) 2020 Peter Antoine
+#							All rights Reserved.
+#					   Released Under the MIT Licence
+#---------------------------------------------------------------------------------
+
+import sys
+import json
+import time
+import heapq
+import importlib
+from threading import Thread, Lock, Condition
+
+# name -> (module, class) - the modules are only imported when started.
+SERVICES = {'scm':			('scm_service', 'SCMService'),
+			'timekeeper':	('timekeeper_service', 'TimeKeeperService')}
+
+output_lock = Lock()
+
+STOP_TIMEOUT = 5
+
+
+def send_line(name, line):
+	with output_lock:
+		sys.stdout.write(name + '\t' + line + '\n')
+		sys.stdout.flush()
+
+
+class Service(object):
+	def __init__(self, name, ident, parameters):
+		self.name = name
+		self.ident = ident
+		self.parameters = parameters
+		self.jobs = []
+		self.messages = []
+		self.sequence = 0
+		self.stopped = False
+		self.condition = Condition()
+		self.thread = None
+
+	def send(self, message):
+		send_line(self.name, json.dumps(message, ensure_ascii=False))
+
+	def every(self, period, function, first=0):
+		""" Call function every period seconds on the service thread. The
+			first call is after first seconds.
+		"""
+		with self.condition:
+			self.sequence += 1
+			heapq.heappush(self.jobs, (time.time() + first, self.sequence, period, function))
+			self.condition.notify()
+
+	def post(self, line):
+		with self.condition:
+			self.messages.append(line)
+			self.condition.notify()
+
+	def stop(self):
+		with self.condition:
+			self.stopped = True
+			self.condition.notify()
+
+	def start(self):
+		pass
+
+	def onMessage(self, line):
+		pass
+
+	def onStop(self):
+		pass
+
+	def run(self):
+		self.start()
+
+		while True:
+			due = None
+			messages = []
+
+			with self.condition:
+				while not self.stopped and len(self.messages) == 0:
+					if len(self.jobs) > 0 and self.jobs[0][0] <= time.time():
+						break
+
+					if len(self.jobs) > 0:
+						self.condition.wait(self.jobs[0][0] - time.time())
+					else:
+						self.condition.wait()
+
+				if self.stopped:
+					break
+
+				(messages, self.messages) = (self.messages, [])
+
+				if len(self.jobs) > 0 and self.jobs[0][0] <= time.time():
+					due = heapq.heappop(self.jobs)
+
+			for line in messages:
+				self.onMessage(line)
+
+			if due is not None:
+				(_, sequence, period, function) = due
+				function()
+
+				with self.condition:
+					heapq.heappush(self.jobs, (time.time() + period, sequence, period, function))
+
+		self.onStop()
+
+
+def start_service(services, ident, name, parameters):
+	if name in SERVICES and name not in services:
+		(module_name, class_name) = SERVICES[name]
+
+		try:
+			service_class = getattr(importlib.import_module(module_name), class_name)
+
+		except (ImportError, AttributeError) as e:
+			send_line('host', json.dumps({'service': name, 'error': str(e)}))
+			return
+
+		service = service_class(name, ident, parameters)
+		service.thread = Thread(target=service.run, daemon=True)
+		service.thread.start()
+		services[name] = service
+
+
+def main():
+	services = {}
+	ident = sys.argv[1]
+
+	for line in sys.stdin:
+		(name, _, body) = line.rstrip('\n').partition('\t')
+
+		if name == 'host':
+			try:
+				control = json.loads(body)
+			except ValueError:
+				continue
+
+			if 'start' in control:
+				start_service(services, ident, control['start'], control.get('parameters', {}))
+
+			elif 'stop' in control and control['stop'] in services:
+				services.pop(control['stop']).stop()
+
+		elif name in services:
+			services[name].post(body)
+
+	for name in services:
+		services[name].stop()
+
+	for name in services:
+		services[name].thread.join(STOP_TIMEOUT)
+
+
+if __name__ == "__main__":
+	# the services import service_host, run that one so there is only one
+	# copy of this module and its output_lock.
+	import service_host
+	service_host.main()
+
+# vim: ts=4 sw=4 noexpandtab nocin ai
@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#---------------------------------------------------------------------------------
+#	  _____			  _ _				 ______					   _
+#	 (_____)		 | (_)				(____  \				  (_)
+#		_	____   _ | |_  ____  ___	 ____)	)_	 _	____  ____ _  ____
+#	   | | |  _ \ / || | |/ _  |/ _ \	|  __  (| | | |/ _	|/ _  | |/ _  )
+#	  _| |_| | | ( (_| | ( ( | | |_| |	| |__)	) |_| ( ( | ( ( | | ( (/ /
+#	 (_____)_| |_|\____|_|\_|| |\___/	|______/ \____|\_|| |\_|| |_|\____)
+#						 (_____|					  (_____(_____|
+#
+#	 file: shared_server
+#	 desc: Sharing one server between many vims over a unix socket.
+#
+#	 The server that vim starts becomes a proxy that copies its stdin/stdout
+#	 to the socket of the shared server for the repositories. If there is no
+#	 shared server it starts one first. The shared server sends everything
+#	 to all of its subscribers and exits when the last one has gone.
+#
+#  author: peter
+#	 date: 18/10/2026
+#---------------------------------------------------------------------------------
+#					  Copyright (c) 2020 Peter Antoine
+#							All rights Reserved.
+#					   Released Under the MIT Licence
+#---------------------------------------------------------------------------------
+
+import os
+import sys
+import time
+import errno
+import socket
+import hashlib
+import tempfile
+import subprocess
+from threading import Thread, Lock
+
+try:
+	import fcntl
+except ImportError:
+	fcntl = None
+
+# unix socket names have to fit in sockaddr_un.
+MAX_SOCKET_PATH = 100
+
+# How long to wait for a new shared server to start listening.
+START_TIMEOUT = 10
+
+
+def socket_name(directory, key=None):
+	""" The socket for the shared server of key (the repositories that it
+		serves), or of the current directory if there is no key.
+	"""
+	if key is None:
+		key = os.path.realpath(os.getcwd())
+
+	result = os.path.join(directory, 'scm-' + hashlib.md5(key.encode('utf-8')).hexdigest()[:12] + '.sock')
+
+	if len(result.encode('utf-8')) > MAX_SOCKET_PATH:
+		digest = hashlib.md5(result.encode('utf-8')).hexdigest()[:16]
+		result = os.path.join(tempfile.gettempdir(), 'indigobuggie-' + digest + '.sock')
+
+	return result
+
+
+def is_supported():
+	return hasattr(socket, 'AF_UNIX') and fcntl is not None
+
+
+def connect(socket_path):
+	result = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+
+	try:
+		result.connect(socket_path)
+
+	except OSError:
+		result.close()
+		result = None
+
+	return result
+
+
+class Listener(object):
+	def __init__(self, socket_path, listen_socket):
+		self.socket_path = socket_path
+		self.socket = listen_socket
+		self.closed = False
+
+	def accept(self, timeout):
+		self.socket.settimeout(timeout)
+		(connection, _) = self.socket.accept()
+		connection.settimeout(None)
+		return connection
+
+	def close(self):
+		""" Stop listening and remove the socket. This holds the start lock,
+			so a new server for the directory cannot be started between the
+			two and then have its socket removed.
+		"""
+		if not self.closed:
+			self.closed = True
+
+			with open(self.socket_path + '.lock', 'w') as lock_file:
+				fcntl.flock(lock_file, fcntl.LOCK_EX)
+				self.socket.close()
+
+				try:
+					os.unlink(self.socket_path)
+				except OSError:
+					pass
+
+				fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def create_listener(socket_path):
+	""" Returns the Listener, or None if another server has the socket """
+	listen_socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+
+	try:
+		listen_socket.bind(socket_path)
+		listen_socket.listen(8)
+
+	except OSError:
+		listen_socket.close()
+		return None
+
+	return Listener(socket_path, listen_socket)
+
+
+class Subscribers(object):
+	""" The connections to the vims that use the shared server """
+	def __init__(self):
+		self.connections = []
+		self.lock = Lock()
+
+	def add(self, connection, greeting_function):
+		""" The greeting (the current state) is sent before anything else.
+			greeting_function() is called with the lock held, so nothing sent
+			to the others can fall between the greeting and the connection
+			being added.
+		"""
+		with self.lock:
+			try:
+				connection.sendall(greeting_function())
+				self.connections.append(connection)
+			except OSError:
+				pass
+
+	def remove(self, connection):
+		""" Returns the number of subscribers that are left """
+		with self.lock:
+			if connection in self.connections:
+				self.connections.remove(connection)
+
+			return len(self.connections)
+
+	def send(self, data):
+		with self.lock:
+			for connection in list(self.connections):
+				try:
+					connection.sendall(data)
+				except OSError:
+					self.connections.remove(connection)
+
+	def sendTo(self, connection, data):
+		with self.lock:
+			if connection in self.connections:
+				try:
+					connection.sendall(data)
+				except OSError:
+					self.connections.remove(connection)
+
+
+def input_function(connection):
+	""" Copy the requests from vim to the server. When vim closes its end the
+		server is told, so it can drop this subscriber.
+	"""
+	try:
+		for line in sys.stdin.buffer:
+			connection.sendall(line)
+
+		connection.shutdown(socket.SHUT_WR)
+
+	except OSError:
+		pass
+
+
+def connect_or_start(socket_path, server_command):
+	""" Connect to the shared server, starting it if it is not running """
+	with open(socket_path + '.lock', 'w') as lock_file:
+		# only one vim at a time can start the server.
+		fcntl.flock(lock_file, fcntl.LOCK_EX)
+
+		connection = connect(socket_path)
+
+		if connection is None:
+			try:
+				os.unlink(socket_path)
+			except OSError as e:
+				if e.errno != errno.ENOENT:
+					return None
+
+			subprocess.Popen(server_command,
+							 cwd=os.getcwd(),
+							 stdin=subprocess.DEVNULL,
+							 stdout=subprocess.DEVNULL,
+							 stderr=subprocess.DEVNULL,
+							 start_new_session=True)
+
+			end_time = time.time() + START_TIMEOUT
+
+			while connection is None and time.time() < end_time:
+				time.sleep(0.05)
+				connection = connect(socket_path)
+
+		fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+	return connection
+
+
+def run_proxy(socket_path, server_command):
+	""" Copy stdin to the shared server and its messages to stdout until vim
+		or the server closes. Returns False if the shared server could not
+		be used.
+	"""
+	connection = None
+	data = b''
+
+	# The server always sends its state first. If nothing arrives then this
+	# connected just as the server was closing down, so start a new one.
+	for attempt in range(2):
+		connection = connect_or_start(socket_path, server_command)
+
+		if connection is None:
+			return False
+
+		try:
+			data = connection.recv(64 * 1024)
+		except OSError:
+			data = b''
+
+		if data != b'':
+			break
+
+		connection.close()
+	else:
+		return False
+
+	input_thread = Thread(target=input_function, args=(connection,), daemon=True)
+	input_thread.start()
+
+	# the server closing ends the proxy, so vim sees the job finish.
+	try:
+		while data != b'':
+			sys.stdout.buffer.write(data)
+			sys.stdout.buffer.flush()
+
+			data = connection.recv(64 * 1024)
+
+	except (IOError, OSError):
+		pass
+
+	connection.close()
+
+	return True
+
+# vim: ts=4 sw=4 noexpandtab nocin ai
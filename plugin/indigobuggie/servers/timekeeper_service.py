@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#---------------------------------------------------------------------------------
+#	  _____			  _ _				 ______					   _
+#	 (_____)		 | (_)				(____  \				  (_)
+#		_	____   _ | |_  ____  ___	 ____)	)_	 _	____  ____ _  ____
+#	   | | |  _ \ / || | |/ _  |/ _ \	|  __  (| | | |/ _	|/ _  | |/ _  )
+#	  _| |_| | | ( (_| | ( ( | | |_| |	| |__)	) |_| ( ( | ( ( | | ( (/ /
+#	 (_____)_| |_|\____|_|\_|| |\___/	|______/ \____|\_|| |\_|| |_|\____)
+#						 (_____|					  (_____(_____|
+#
+#	 file: timekeeper_service
+#	 desc: Tells the TimeKeeper when the version of the repository changes.
+#
+#	 The repository HEAD is read every poll, the version is only asked of the
+#	 SCM when HEAD has moved.
+#
+#  author: peter
+#	 date: 18/10/2026
+#---------------------------------------------------------------------------------
+#					  Copyright (c) 2020 Peter Antoine
+#							All rights Reserved.
+#					   Released Under the MIT Licence
+#---------------------------------------------------------------------------------
+
+import os
+import sys
+from service_host import Service
+from file_watcher import find_repository_dir
+from fingerprint import read_head
+
+# Need to set the path up for boernlib
+current = os.path.abspath(__file__)
+parent,_ = os.path.split(current)
+parent,_ = os.path.split(parent)
+parent,_ = os.path.split(parent)
+
+beorn_lib_path = os.path.join(parent, 'beorn_lib')
+
+if beorn_lib_path not in sys.path:
+	sys.path.insert(1, beorn_lib_path)
+
+import beorn_lib
+
+
+def find_repository(path):
+	""" Find the root of the git repository that path is in """
+	path = os.path.abspath(path)
+
+	while True:
+		if find_repository_dir(path) is not None:
+			return path
+
+		(parent, _) = os.path.split(path)
+
+		if parent == path:
+			return None
+
+		path = parent
+
+
+class TimeKeeperService(Service):
+	def start(self):
+		""" Tells vim if a repository was found, if not vim has to poll """
+		self.root = find_repository(self.parameters.get('root', '.'))
+		self.scm = None
+		self.head = None
+
+		if self.root is not None:
+			self.repo_dir = find_repository_dir(self.root)
+
+			try:
+				self.scm = beorn_lib.scm.create('Git', working_dir=self.root)
+			except Exception:
+				self.scm = None
+
+		if self.scm:
+			self.send({'found': True, 'type': 'Git', 'root': os.path.realpath(self.root)})
+			self.every(int(self.parameters.get('poll_period', 36)), self.checkVersion)
+		else:
+			self.send({'found': False})
+
+	def checkVersion(self):
+		""" The version is asked for in the same way as vim does, but only
+			when HEAD has moved.
+		"""
+		head = read_head(self.repo_dir)
+
+		if head is not None and head != self.head:
+			self.head = head
+			self.send({'version': self.scm.getCurrentVersion()})
+
+# vim: ts=4 sw=4 noexpandtab nocin ai
@@ -178,6 +178,26 @@ class TabControl(object):
 
 		return result
 
+	def getTimings(self):
+		result = {}
+
+		tab = self.getCurrentTab()
+
+		if tab is not None:
+			result = tab.getTimings()
+
+		return result
+
+	def getServerStats(self):
+		result = {}
+
+		tab = self.getCurrentTab()
+
+		if tab is not None:
+			result = tab.getServerStats()
+
+		return result
+
 	def closeAllTabs(self):
 		for tab in self.tab_list:
 			self.tab_list[tab].close()
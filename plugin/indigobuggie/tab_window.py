@@ -22,6 +22,8 @@
 
 import os
 import vim
+import json
+import time
 import base64
 import beorn_lib
 from threading import Lock
@@ -44,6 +46,10 @@ class TabWindow(object):
 		self.help_enabled = False
 		self.active_timers = {}
 		self.background_server = []
+		self.server_buffers = {}
+		self.services = {}
+		self.timings = {}
+		self.open_time = time.time()
 		self.resource_dir = None
 		self.tab_control = tab_control
 
@@ -88,6 +94,28 @@ class TabWindow(object):
 	def toggle(self):
 		self.displayed = not self.displayed
 
+	def markTime(self, name):
+		""" Record the time from the tab opening to the first time name happens """
+		if name not in self.timings:
+			self.timings[name] = round(time.time() - self.open_time, 3)
+
+	def getTimings(self):
+		return self.timings
+
+	def getServerStats(self):
+		""" Returns repository root -> the status scans the server has executed
+			and skipped for it.
+		"""
+		result = {}
+
+		scm_feature = self.getFeature('SCMFeature')
+
+		if scm_feature is not None:
+			for scm in scm_feature.listSCMs():
+				result[scm.scm.getRoot()] = scm_feature.getServerStats(scm.scm.getRoot())
+
+		return result
+
 	def attachFeature(self, feature):
 		self.features.append(feature)
 
@@ -882,21 +910,90 @@ class TabWindow(object):
 				vim.command("echomsg 'error: " + str(e) + "'")
 
 			self.background_server.append(BackgroundServer(server_name, server_callback))
+			self.markTime('server_started')
 			result = True
 
 		return result
 
 	def sendBackgroundServerMessage(self, server_name, message):
-		for bs in self.background_server:
+		""" Send a single line message to the server, returns False if the
+			server is not running.
+		"""
+		result = False
+
+		for index, bs in enumerate(self.background_server):
 			if bs is not None and bs.name == server_name:
-				vim.eval('ch_sendraw(' + str(bs.channel) + ', ' + message + ')')
+				send_function = vim.Function('IB_SendBackgroundServerMessage')
+				result = send_function(self.ident, index, message) == 1
 				break
 
+		return result
+
 	def onServerCallback(self, server_id, message):
+		""" The channel is raw, so a message can be split over many callbacks.
+			The parts are held until the end of the line arrives, so the server
+			callback only ever gets whole lines.
+		"""
 		s_id_int = int(server_id)
 
 		if len(self.background_server) > s_id_int and self.background_server[s_id_int] is not None:
-			self.background_server[s_id_int].callback(message)
+			pending = self.server_buffers.setdefault(s_id_int, [])
+
+			if '\n' not in message:
+				pending.append(message)
+			else:
+				(complete, _, remainder) = message.rpartition('\n')
+				pending.append(complete)
+
+				if remainder != '':
+					self.server_buffers[s_id_int] = [remainder]
+				else:
+					self.server_buffers[s_id_int] = []
+
+				self.background_server[s_id_int].callback(''.join(pending))
+
+	def startService(self, name, callback, parameters):
+		""" Start a service in the service host, the host is started with
+			the first service. Returns False if the service could not be started.
+		"""
+		self.startBackgroundServer('service_host', self.onServiceMessage, '{}')
+
+		self.services[name] = callback
+		result = self.sendBackgroundServerMessage('service_host', 'host\t' + json.dumps({'start': name, 'parameters': parameters}))
+
+		if not result:
+			del self.services[name]
+
+		return result
+
+	def sendServiceMessage(self, name, message):
+		return self.sendBackgroundServerMessage('service_host', name + '\t' + message)
+
+	def stopService(self, name):
+		if name in self.services:
+			del self.services[name]
+			self.sendBackgroundServerMessage('service_host', 'host\t' + json.dumps({'stop': name}))
+
+	def onServiceMessage(self, message):
+		""" Each line is the name of the service and its message. The lines
+			are passed to the services in order, a service at a time.
+		"""
+		name = None
+		lines = []
+
+		for line in message.split('\n'):
+			(service, _, body) = line.partition('\t')
+
+			if service != name and len(lines) > 0:
+				if name in self.services:
+					self.services[name]('\n'.join(lines))
+				lines = []
+
+			name = service
+			lines.append(body)
+
+		if len(lines) > 0 and name in self.services:
+			self.services[name]('\n'.join(lines))
 
 	def stopBackgroundServer(self, server):
 		for index, bs in enumerate(self.background_server):
@@ -904,6 +1001,7 @@ class TabWindow(object):
 				# TODO: fix this
 				#vim.eval('IB_StopBackgroundServer(' + str(index) + ')')
 				self.background_server[index] = None
+				self.server_buffers.pop(index, None)
 				break
 
 	def close(self):